@@ -0,0 +1,153 @@
+"""Online backups of the attendance database, taken while the app and terminals keep working.
+
+The live file is copied with SQLite's backup API a few pages per step, pausing
+between steps, all from one read snapshot. Under WAL a reader never blocks writers,
+so check-ins carry on, and the copy is consistent as of the moment it started.
+Snapshots can be gzip-compressed; each gets a SHA-256 sidecar in sha256sum format,
+and the oldest are pruned beyond a retention count.
+
+    python cli.py backup backups --compress --keep 14
+    python cli.py verify-backup backups/attendance-20240314-180000.db.gz
+"""
+import glob
+import gzip
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+import database
+
+CHUNK_SIZE = 1024 * 1024
+
+SNAPSHOT_NAME = re.compile(r"attendance-\d{8}-\d{6}(-\d+)?\.db(\.gz)?")
+
+def copy_database(source, target, pages=256, pause=0.01, progress=None):
+    """Copies the SQLite database at source into target, pages at a time.
+
+    The copy holds one read transaction throughout. Without it, any write from
+    another connection between steps restarts the backup from the first page,
+    which on a busy database means it never finishes. pause (seconds) is slept
+    after each step to leave disk time for the app. progress(done, total) is
+    called per step in pages; raising from it abandons the copy.
+    """
+    src = sqlite3.connect(source, isolation_level=None)
+    dst = sqlite3.connect(target)
+    try:
+        src.execute("BEGIN")
+        src.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+
+        def step(status, remaining, total):
+            if progress:
+                progress(total - remaining, total)
+            if remaining and pause:
+                time.sleep(pause)
+        src.backup(dst, pages=pages, progress=step)
+    finally:
+        dst.close()
+        src.close()
+
+def file_checksum(path, opener=open):
+    digest = hashlib.sha256()
+    with opener(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _new_snapshot_path(directory):
+    stamp = f"attendance-{datetime.now():%Y%m%d-%H%M%S}"
+    path, n = os.path.join(directory, stamp + ".db"), 1
+    while glob.glob(glob.escape(path) + "*"):
+        path, n = os.path.join(directory, f"{stamp}-{n}.db"), n + 1
+    return path
+
+def snapshot(directory, compress=False, keep=None, pages=256, pause=0.01, progress=None):
+    """Backs the live database up into directory and returns the snapshot's path.
+
+    The copy must pass PRAGMA quick_check, and a compressed snapshot must
+    decompress to exactly the copy, before it replaces anything; a failed or
+    cancelled backup leaves no file behind. Term archives that are missing or
+    older in directory are copied alongside. keep, if given, is how many
+    snapshots to leave in directory, newest first.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = _new_snapshot_path(directory)
+    partials = [path + ".part"]
+    try:
+        copy_database(database.DB_PATH, partials[0], pages, pause, progress)
+        check = sqlite3.connect(partials[0])
+        try:
+            result = check.execute("PRAGMA quick_check").fetchone()[0]
+        finally:
+            check.close()
+        if result != "ok":
+            raise sqlite3.DatabaseError(f"The backup copy failed its integrity check: {result}")
+        if compress:
+            raw, path = partials[0], path + ".gz"
+            partials.append(path + ".part")
+            with open(raw, "rb") as source, gzip.open(partials[1], "wb", compresslevel=6) as packed:
+                shutil.copyfileobj(source, packed, CHUNK_SIZE)
+            if file_checksum(partials[1], gzip.open) != file_checksum(raw):
+                raise OSError(f"{path} did not decompress to the database copy.")
+            os.remove(raw)
+        digest = file_checksum(partials[-1])
+        os.replace(partials[-1], path)
+    except BaseException:
+        for partial in partials:
+            if os.path.exists(partial):
+                os.remove(partial)
+        raise
+    with open(path + ".sha256", "w") as sidecar:
+        sidecar.write(f"{digest}  {os.path.basename(path)}\n")
+    _copy_archives(directory, pages, pause)
+    if keep:
+        prune(directory, keep)
+    return path
+
+def _copy_archives(directory, pages, pause):
+    """Copies term archives next to the snapshots, under the relative paths the live database records."""
+    for _, _, _, _, stored in database.get_archives():
+        source = database.archive_path(stored)
+        target = os.path.join(directory, stored) if not os.path.isabs(stored) else None
+        if target is None or not os.path.exists(source):
+            continue
+        if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source):
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        copy_database(source, target + ".part", pages, pause)
+        os.replace(target + ".part", target)
+
+def snapshots(directory):
+    """Returns the snapshot paths in directory, oldest first."""
+    paths = [os.path.join(directory, name) for name in os.listdir(directory) if SNAPSHOT_NAME.fullmatch(name)]
+    return sorted(paths, key=os.path.getmtime)
+
+def prune(directory, keep):
+    """Deletes all but the newest keep snapshots (and their checksums); returns the paths removed."""
+    removed = snapshots(directory)[:-keep] if keep > 0 else []
+    for path in removed:
+        os.remove(path)
+        if os.path.exists(path + ".sha256"):
+            os.remove(path + ".sha256")
+    return removed
+
+def verify(path):
+    """Checks a snapshot against its .sha256 sidecar; a compressed one must also decompress cleanly.
+
+    A snapshot without a readable sidecar fails, as there is nothing to check it against.
+    """
+    try:
+        with open(path + ".sha256") as sidecar:
+            expected = sidecar.read().split()[0]
+    except (OSError, IndexError):
+        return False
+    if file_checksum(path) != expected:
+        return False
+    if path.endswith(".gz"):
+        try:
+            file_checksum(path, gzip.open)
+        except (OSError, EOFError):
+            return False
+    return True
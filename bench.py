@@ -0,0 +1,209 @@
+"""Benchmarks the database layer and the table-loading paths at institutional scale.
+
+Builds a deterministic synthetic database per scale (same seed, same data), times
+the hot operations and writes machine-readable results for comparing versions:
+
+    python bench.py --scale small --scale medium -o results.json
+    python bench.py --scale large --keep-db /var/tmp/bench
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date as Date, timedelta
+import database
+import exporter
+import matrix
+
+# students, classes, enrollments, days of attendance (attendance rows ~= enrollments * days)
+SCALES = {
+    "tiny": (500, 20, 5000, 20),
+    "small": (5000, 200, 50000, 30),
+    "medium": (20000, 800, 200000, 60),
+    "large": (50000, 2000, 500000, 40),
+}
+
+FIRST_DAY = Date(2024, 1, 1)
+FIRST_NAMES = ("Ada", "Ben", "Chen", "Dara", "Eve", "Femi", "Gita", "Hugo", "Ines", "Jon", "Kofi", "Lena",
+               "Mina", "Noah", "Omar", "Pia", "Quinn", "Rosa", "Sami", "Tara", "Uma", "Vik", "Wen", "Yara")
+LAST_NAMES = ("Adams", "Banda", "Costa", "Diallo", "Evans", "Fischer", "Garcia", "Haddad", "Ito", "Jensen",
+              "Kim", "Lopez", "Mensah", "Novak", "Okafor", "Patel", "Quist", "Rossi", "Singh", "Tanaka")
+
+def generate(path, students, classes, enrollments, days, seed=42):
+    """Creates a populated database at path; identical arguments always produce identical data."""
+    rng = random.Random(seed)
+    database.configure(path)
+    database.setup_database()
+    conn = database.get_connection()
+    student_ids = [f"S{i:08d}" for i in range(students)]
+    with conn:
+        conn.executemany("INSERT INTO students (student_id, full_name) VALUES (?, ?)",
+                         ((sid, f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}") for i, sid in enumerate(student_ids)))
+        conn.executemany("INSERT INTO classes (class_id, class_name) VALUES (?, ?)",
+                         ((class_id, f"Class {class_id:04d}") for class_id in range(1, classes + 1)))
+    rosters = {}
+    per_class = enrollments // classes
+    with conn:
+        for class_id in range(1, classes + 1):
+            rosters[class_id] = rng.sample(student_ids, min(per_class, students))
+            conn.executemany("INSERT INTO enrollments (student_id, class_id) VALUES (?, ?)",
+                             ((sid, class_id) for sid in rosters[class_id]))
+    weights = (0.85, 0.1, 0.05)
+
+    def attendance():
+        for day in range(days):
+            date = (FIRST_DAY + timedelta(days=day)).isoformat()
+            for class_id, roster in rosters.items():
+                statuses = rng.choices(database.STATUSES, weights, k=len(roster))
+                for sid, status in zip(roster, statuses):
+                    yield sid, class_id, date, status
+    database.load_attendance(attendance())
+    database.optimize(analyze=True)
+    return rosters
+
+def measure(fn, repeat):
+    """Runs fn repeat times and returns timing statistics in milliseconds plus fn's row count."""
+    timings, rows = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+        rows = result if isinstance(result, int) else len(result) if result is not None else None
+    return {"median_ms": round(statistics.median(timings), 3), "min_ms": round(min(timings), 3),
+            "max_ms": round(max(timings), 3), "repeat": repeat, "rows": rows}
+
+def run_scale(name, workdir, repeat, seed):
+    students, classes, enrollments, days = SCALES[name]
+    path = os.path.join(workdir, f"bench-{name}.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    started = time.perf_counter()
+    rosters = generate(path, students, classes, enrollments, days, seed)
+    generated = time.perf_counter() - started
+    conn = database.get_connection()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    counts = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+              for table in ("students", "classes", "enrollments", "attendance")}
+    db_bytes = os.path.getsize(path)
+    try:
+        table_bytes = dict(conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name ORDER BY 2 DESC"))
+    except sqlite3.OperationalError:
+        table_bytes = None  # SQLite built without the dbstat table
+
+    class_id = 1
+    roster = rosters[class_id]
+    last_day = (FIRST_DAY + timedelta(days=days - 1)).isoformat()
+    month_start = max(FIRST_DAY, FIRST_DAY + timedelta(days=days - 30)).isoformat()
+    first_day = FIRST_DAY.isoformat()
+    new_day = (FIRST_DAY + timedelta(days=days)).isoformat()
+    marks = [(sid, "Present") for sid in roster]
+    export_path = os.path.join(workdir, f"bench-{name}.csv")
+    singles = iter(range(10 ** 9))
+
+    benchmarks = {
+        "mark_attendance": lambda: database.mark_attendance(roster[next(singles) % len(roster)], class_id, new_day, "Late"),
+        "save_attendance": lambda: database.mark_attendance_bulk(class_id, new_day, marks),
+        "get_students_by_class": lambda: database.get_students_by_class(class_id),
+        "get_class_roster": lambda: database.get_class_roster(class_id, last_day),
+        "get_attendance_report_30d": lambda: database.get_attendance_report(class_id, month_start, last_day),
+        "generate_report_first_page": lambda: (database.count_attendance_report(class_id, first_day, last_day),
+                                               database.get_attendance_report_page(class_id, first_day, last_day))[1],
+        "get_attendance_summary": lambda: database.get_attendance_summary(class_id, first_day, last_day),
+        "get_daily_summary": lambda: database.get_daily_summary(class_id, first_day, last_day),
+        "export_csv_full_range": lambda: exporter.export_attendance_report(export_path, class_id, first_day, last_day),
+        "attendance_matrix_full_range": lambda: matrix.load(class_id, first_day, last_day).students,
+        "export_matrix_full_range": lambda: exporter.export_attendance_matrix(export_path, class_id, first_day, last_day),
+        "scan_attendance_table": lambda: conn.execute("SELECT COUNT(*), MAX(status), SUM(class_id) FROM attendance NOT INDEXED").fetchone()[0],
+    }
+    benchmarks.update(gui_benchmarks(class_id, first_day, last_day))
+    results = {label: measure(fn, repeat) for label, fn in benchmarks.items()}
+    os.remove(export_path)
+
+    database.close_connections()
+    return {"scale": name, "counts": counts, "generate_s": round(generated, 2),
+            "db_bytes": db_bytes, "table_bytes": table_bytes, "benchmarks": results, "path": path}
+
+def gui_benchmarks(class_id, first_day, last_day):
+    """Times the model population behind generate_report and load_students_for_attendance, if PyQt6 is installed."""
+    try:
+        from models import PagedTableModel, MatrixTableModel, AttendanceModel
+    except ImportError:
+        return {}
+    report_model, attendance_model = PagedTableModel(exporter.REPORT_HEADERS), AttendanceModel()
+    matrix_model = MatrixTableModel()
+
+    def generate_report():
+        page_size = report_model.page_size
+
+        # The Reports tab runs this on the worker pool; here the page is handed back straight away.
+        def fetch_page(after, on_page):
+            on_page(database.get_attendance_report_page(class_id, first_day, last_day, after, page_size))
+        total = database.count_attendance_report(class_id, first_day, last_day)
+        report_model.set_source(fetch_page, database.get_attendance_report_page(class_id, first_day, last_day, None, page_size),
+                                total)
+        return report_model.rowCount()
+
+    def load_roster():
+        attendance_model.set_roster(database.get_class_roster(class_id, last_day))
+        return attendance_model.marks()
+    def generate_matrix():
+        matrix_model.set_matrix(matrix.load(class_id, first_day, last_day))
+        # Read every cell once, as a view scrolled across the whole grid would.
+        cells = [matrix_model.index(row, column).data() for row in range(matrix_model.rowCount())
+                 for column in range(matrix_model.columnCount())]
+        return len(cells)
+    return {"gui_generate_report": generate_report, "gui_generate_matrix": generate_matrix,
+            "gui_load_roster_and_marks": load_roster}
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version, "platform": platform.platform(),
+            "commit": commit, "schema_version": len(database.MIGRATIONS)}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the attendance database at several data scales.")
+    parser.add_argument("--scale", action="append", choices=sorted(SCALES), help="repeatable; default: tiny and small")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("-o", "--output", help="write JSON results here (default: stdout)")
+    parser.add_argument("--keep-db", metavar="DIR", help="build and keep the generated databases in DIR")
+    args = parser.parse_args(argv)
+
+    workdir = args.keep_db or tempfile.mkdtemp(prefix="impresent-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    runs = []
+    for name in args.scale or ["tiny", "small"]:
+        run = run_scale(name, workdir, args.repeat, args.seed)
+        if not args.keep_db:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(run["path"] + suffix):
+                    os.remove(run["path"] + suffix)
+            del run["path"]
+        runs.append(run)
+        print(f"{name}: {run['counts']['attendance']} attendance rows, generated in {run['generate_s']} s", file=sys.stderr)
+        for label, stats in run["benchmarks"].items():
+            print(f"  {label:<28} {stats['median_ms']:>10.3f} ms  ({stats['rows']} rows)", file=sys.stderr)
+    if not args.keep_db:
+        os.rmdir(workdir)
+
+    report = json.dumps({"environment": environment(), "runs": runs}, indent=2)
+    if args.output:
+        with open(args.output, "w") as out:
+            out.write(report + "\n")
+    else:
+        print(report)
+
+if __name__ == "__main__":
+    main()
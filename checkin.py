@@ -0,0 +1,215 @@
+import os
+import queue
+import re
+import threading
+import time
+import database
+
+BADGE_PREFIX = "IMPRESENT:"
+
+def badge_payload(student_id):
+    return BADGE_PREFIX + student_id
+
+def parse_payload(text):
+    """Returns the student ID encoded in a badge, or None for QR codes that are not ours."""
+    return text[len(BADGE_PREFIX):] if text and text.startswith(BADGE_PREFIX) else None
+
+def _require_vision():
+    try:
+        import cv2
+        import numpy
+    except ImportError as e:
+        raise RuntimeError("QR check-in needs the opencv-python package (pip install opencv-python).") from e
+    return cv2, numpy
+
+def render_badge(student_id, full_name, scale=8):
+    """Returns a badge image (QR code with the student's name underneath) as a grayscale array."""
+    cv2, numpy = _require_vision()
+    try:
+        import qrcode
+    except ImportError as e:
+        raise RuntimeError("Badge generation needs the qrcode package (pip install qrcode).") from e
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, border=4)
+    qr.add_data(badge_payload(student_id))
+    qr.make(fit=True)
+    code = numpy.where(numpy.array(qr.get_matrix(), dtype=bool), 0, 255).astype(numpy.uint8)
+    code = cv2.resize(code, None, fx=scale, fy=scale, interpolation=cv2.INTER_NEAREST)
+    caption = numpy.full((6 * scale, code.shape[1]), 255, dtype=numpy.uint8)
+    cv2.putText(caption, f"{full_name} ({student_id})", (2 * scale, 4 * scale),
+                cv2.FONT_HERSHEY_SIMPLEX, scale / 16, 0, max(1, scale // 8), cv2.LINE_AA)
+    return numpy.vstack([code, caption])
+
+def generate_badges(students, out_dir, scale=8, progress=None):
+    """Writes one PNG badge per (student_id, full_name) into out_dir and returns the file paths."""
+    cv2, _ = _require_vision()
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for done, (student_id, full_name) in enumerate(students, start=1):
+        path = os.path.join(out_dir, re.sub(r'[^\w.-]', '_', student_id) + '.png')
+        cv2.imwrite(path, render_badge(student_id, full_name, scale))
+        paths.append(path)
+        if progress:
+            progress(done, len(students))
+    return paths
+
+class CheckInPipeline:
+    """Scans badges from a camera or video file and records each student's attendance once.
+
+    Three threads hand work along: capture reads frames into a one-slot buffer,
+    decode finds QR codes in the newest frame, and a writer batches check-ins into
+    mark_attendance_bulk transactions. When decoding falls behind, capture replaces
+    the waiting frame instead of queueing it, so a slow decoder skips frames rather
+    than lagging further behind the people in front of the camera.
+
+    source is a camera index or a video file path. Video files play back at their
+    recorded frame rate (realtime=True) so they behave like a camera; pass
+    realtime=False and drop_frames=False to decode every frame as fast as possible.
+    on_checkin(student_id) and on_reject(payload) are called from worker threads.
+    db is the database module or a service.Client for terminals sharing a service.
+    """
+    def __init__(self, source, class_id, date, status="Present", roster_ids=None,
+                 on_checkin=None, on_reject=None, batch_size=50, flush_interval=1.0,
+                 realtime=True, drop_frames=True, db=database):
+        self.source, self.class_id, self.date, self.status = source, class_id, date, status
+        self.db = db
+        self.roster_ids = roster_ids
+        self.on_checkin, self.on_reject = on_checkin, on_reject
+        self.batch_size, self.flush_interval = batch_size, flush_interval
+        self.realtime, self.drop_frames = realtime, drop_frames
+        self.frames_read = self.frames_skipped = self.frames_decoded = 0
+        self.checked_in = []
+        self.rejected = 0
+        self.error = None
+        self._seen = set()
+        self._frames = queue.Queue(maxsize=1)
+        self._marks = queue.Queue()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self.roster_ids is None:
+            self.roster_ids = {student_id for student_id, _ in self.db.get_students_by_class(self.class_id)}
+        for target in (self._capture, self._decode, self._write):
+            thread = threading.Thread(target=self._guard, args=(target,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        """Stops capturing; check-ins already decoded are still written before the threads exit."""
+        self._stop.set()
+
+    def wait(self, timeout=None):
+        for thread in self._threads:
+            thread.join(timeout)
+        if self.error:
+            raise self.error
+        return self.checked_in
+
+    def is_running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def run(self):
+        """Processes the whole source (e.g. a video file) and returns the student IDs checked in."""
+        return self.start().wait()
+
+    def _guard(self, target):
+        try:
+            target()
+        except Exception as e:
+            self.error = e
+            self._stop.set()
+
+    def _capture(self):
+        cv2, _ = _require_vision()
+        capture = cv2.VideoCapture(self.source)
+        if not capture.isOpened():
+            self._put_frame(None)
+            raise RuntimeError(f"Could not open video source {self.source!r}.")
+        is_file = not isinstance(self.source, int)
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30
+        started = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                self.frames_read += 1
+                if is_file and self.realtime:
+                    delay = started + self.frames_read / fps - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                self._put_frame(frame)
+        finally:
+            capture.release()
+            self._put_frame(None)
+
+    def _put_frame(self, frame):
+        if frame is not None and self.drop_frames:
+            try:
+                self._frames.get_nowait()
+                self.frames_skipped += 1
+            except queue.Empty:
+                pass
+        self._frames.put(frame)
+
+    def _decode(self):
+        cv2, _ = _require_vision()
+        detector = cv2.QRCodeDetector()
+        try:
+            while True:
+                frame = self._frames.get()
+                if frame is None:
+                    break
+                self.frames_decoded += 1
+                found, payloads, _, _ = detector.detectAndDecodeMulti(frame)
+                if not found:
+                    # Blurred or compressed frames often decode once binarised.
+                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+                    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+                    payloads = (detector.detectAndDecode(binary)[0],)
+                for payload in payloads:
+                    if payload:
+                        self._accept(payload)
+        finally:
+            self._marks.put(None)
+
+    def _accept(self, payload):
+        # A badge stays in view for many frames; only its first sighting counts.
+        if payload in self._seen:
+            return
+        self._seen.add(payload)
+        student_id = parse_payload(payload)
+        if student_id is None or student_id not in self.roster_ids:
+            self.rejected += 1
+            if self.on_reject:
+                self.on_reject(payload)
+            return
+        self._marks.put(student_id)
+
+    def _write(self):
+        pending, deadline = [], None
+        while True:
+            try:
+                timeout = None if deadline is None else max(0, deadline - time.monotonic())
+                student_id = self._marks.get(timeout=timeout)
+            except queue.Empty:
+                self._flush(pending)
+                pending, deadline = [], None
+                continue
+            if student_id is None:
+                break
+            pending.append(student_id)
+            deadline = deadline or time.monotonic() + self.flush_interval
+            if len(pending) >= self.batch_size:
+                self._flush(pending)
+                pending, deadline = [], None
+        if pending:
+            self._flush(pending)
+
+    def _flush(self, student_ids):
+        self.db.mark_attendance_bulk(self.class_id, self.date, [(student_id, self.status) for student_id in student_ids])
+        self.checked_in.extend(student_ids)
+        if self.on_checkin:
+            for student_id in student_ids:
+                self.on_checkin(student_id)
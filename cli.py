@@ -0,0 +1,247 @@
+"""Command-line access to the attendance database for scripts and cron jobs.
+
+Imports nothing from Qt, so it starts quickly and runs without a display. Reports
+stream to stdout as CSV in bounded batches.
+
+    python cli.py report "Math 101" 2024-01-01 2024-06-30 > math.csv
+    python cli.py summary 3 2024-01-01 2024-06-30 --daily
+    python cli.py summary 3 2024-01-01 2024-06-30 --matrix
+    python cli.py export 3 2024-01-01 2024-06-30 -o term.csv
+    python cli.py import students students.csv
+    python cli.py mark 3 2024-03-14 Present S001 S002 S003
+    python cli.py archive 2023-24 2023-09-01 2024-06-30
+    python cli.py backup backups --compress --keep 14
+    python cli.py serve --port 8757
+    python cli.py --service 127.0.0.1:8757 mark 3 2024-03-14 Present S004
+    python cli.py --profile --trace-log slow.jsonl report 3 2024-01-01 2024-06-30 > /dev/null
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+import database
+import exporter
+import instrument
+import matrix
+
+# The database module, or a service.Client with the same functions when --service is given.
+db = database
+
+def resolve_class(value):
+    """Accepts a class ID or an exact class name."""
+    if value.isdigit():
+        return int(value)
+    for class_id, class_name in db.get_classes():
+        if class_name == value:
+            return class_id
+    raise SystemExit(f"error: no class named {value!r}")
+
+def write_rows(headers, batches):
+    writer = csv.writer(sys.stdout)
+    writer.writerow(headers)
+    for batch in batches:
+        writer.writerows(batch)
+
+def cmd_report(args):
+    class_id = resolve_class(args.class_)
+    write_rows(exporter.REPORT_HEADERS, db.iter_attendance_report(class_id, args.start, args.end, args.batch_size))
+
+def cmd_summary(args):
+    class_id = resolve_class(args.class_)
+    if args.matrix:
+        grid = matrix.load(class_id, args.start, args.end, db)
+        write_rows(grid.headers(), [grid.rows()])
+    elif args.daily:
+        write_rows(exporter.DAILY_HEADERS, [db.get_daily_summary(class_id, args.start, args.end)])
+    else:
+        write_rows(exporter.SUMMARY_HEADERS, [db.get_attendance_summary(class_id, args.start, args.end)])
+
+def cmd_export(args):
+    class_id = resolve_class(args.class_)
+    if args.matrix:
+        count = exporter.export_attendance_matrix(args.output, class_id, args.start, args.end, db=db)
+    elif args.summary or args.daily:
+        count = exporter.export_attendance_summary(args.output, class_id, args.start, args.end, daily=args.daily, db=db)
+    else:
+        count = exporter.export_attendance_report(args.output, class_id, args.start, args.end, db=db)
+    print(f"{count} rows written to {args.output}", file=sys.stderr)
+
+def cmd_import(args):
+    if db is database:
+        import importer
+    else:
+        importer = db
+    # A service resolves paths against its own working directory.
+    path = os.path.abspath(args.path)
+    if args.kind == "students":
+        result = importer.import_students(path)
+    else:
+        result = importer.import_enrollments(path, create_classes=args.create_classes)
+    print(result.summary(), file=sys.stderr)
+    return 1 if result.conflicts else 0
+
+def cmd_mark(args):
+    class_id = resolve_class(args.class_)
+    if args.status not in database.STATUSES:
+        raise SystemExit(f"error: status must be one of {', '.join(database.STATUSES)}")
+    student_ids = args.student_ids or [line.strip() for line in sys.stdin if line.strip()]
+    try:
+        db.mark_attendance_bulk(class_id, args.date, [(student_id, args.status) for student_id in student_ids])
+    except sqlite3.IntegrityError:
+        # The batch is one transaction, so nothing was marked; name the IDs behind a foreign key failure.
+        unknown = db.unknown_students(student_ids)
+        if unknown:
+            raise SystemExit(f"error: unknown student ID(s) {', '.join(map(repr, unknown))}; nothing was marked")
+        raise
+    print(f"{len(student_ids)} students marked {args.status}", file=sys.stderr)
+
+def cmd_archive(args):
+    moved = db.archive_term(args.term, args.start, args.end, args.path, compact=not args.no_vacuum)
+    print(f"{moved} attendance records moved to the {args.term!r} archive", file=sys.stderr)
+
+def cmd_archives(args):
+    write_rows(("Term", "First Day", "Last Day", "Records", "Path"), [db.get_archives()])
+
+def cmd_backup(args):
+    if db is database:
+        import backup
+    else:
+        backup = db
+    # Like imports, a service resolves paths against its own working directory.
+    path = backup.snapshot(os.path.abspath(args.directory), args.compress, args.keep, args.pages, args.pause)
+    print(f"Backed up to {path}", file=sys.stderr)
+
+def cmd_verify_backup(args):
+    import backup
+    failed = [path for path in args.paths if not backup.verify(path)]
+    for path in args.paths:
+        print(f"{path}: {'FAILED' if path in failed else 'OK'}", file=sys.stderr)
+    return 1 if failed else 0
+
+def cmd_maintain(args):
+    if db is not database:
+        raise SystemExit("error: maintain works on the database file; run it without --service")
+    if args.rebuild_rollups:
+        database.rebuild_rollups()
+    if args.vacuum:
+        database.vacuum()
+    database.optimize(analyze=args.analyze)
+    problems = database.check_query_plans()
+    for name, step in problems:
+        print(f"{name}: {step}", file=sys.stderr)
+    return 1 if problems else 0
+
+def cmd_serve(args):
+    import service
+    server = service.AttendanceService(args.db, args.host, args.port)
+    print(f"Serving {args.db} on {args.host}:{args.port}", file=sys.stderr)
+    server.run()
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Headless access to the attendance database.")
+    parser.add_argument("--db", default=database.DB_PATH, help="database file (default: %(default)s)")
+    parser.add_argument("--service", metavar="HOST:PORT", help="go through a running attendance service (see serve)")
+    parser.add_argument("--profile", action="store_true", help="print per-call and per-statement timings to stderr")
+    parser.add_argument("--trace-log", metavar="FILE", help="append slow calls and query plans to FILE as JSON lines")
+    parser.add_argument("--slow-ms", type=float, default=100.0, help="threshold for --trace-log (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def ranged(name, help):
+        command = commands.add_parser(name, help=help)
+        command.add_argument("class_", metavar="CLASS", help="class ID or name")
+        command.add_argument("start", help="first date, YYYY-MM-DD")
+        command.add_argument("end", help="last date, YYYY-MM-DD")
+        return command
+
+    report = ranged("report", "stream detailed attendance records as CSV")
+    report.add_argument("--batch-size", type=int, default=5000)
+    report.set_defaults(handler=cmd_report)
+
+    summary = ranged("summary", "per-student attendance counts and rates as CSV")
+    summary.add_argument("--daily", action="store_true", help="per-day class totals instead")
+    summary.add_argument("--matrix", action="store_true", help="a student-by-date grid of status codes with totals")
+    summary.set_defaults(handler=cmd_summary)
+
+    export = ranged("export", "write a report to a CSV file")
+    export.add_argument("-o", "--output", required=True)
+    export.add_argument("--summary", action="store_true", help="export the per-student summary")
+    export.add_argument("--daily", action="store_true", help="export the per-day class totals")
+    export.add_argument("--matrix", action="store_true", help="export the student-by-date grid")
+    export.set_defaults(handler=cmd_export)
+
+    imports = commands.add_parser("import", help="bulk-import students or enrollments from CSV")
+    imports.add_argument("kind", choices=("students", "enrollments"))
+    imports.add_argument("path")
+    imports.add_argument("--create-classes", action="store_true", help="add classes named in an enrollments file")
+    imports.set_defaults(handler=cmd_import)
+
+    mark = commands.add_parser("mark", help="mark students for a class and date (IDs from arguments or stdin)")
+    mark.add_argument("class_", metavar="CLASS", help="class ID or name")
+    mark.add_argument("date", help="YYYY-MM-DD")
+    mark.add_argument("status", help="Present, Absent or Late")
+    mark.add_argument("student_ids", nargs="*")
+    mark.set_defaults(handler=cmd_mark)
+
+    archive = commands.add_parser("archive", help="move a closed term's attendance into its own archive file")
+    archive.add_argument("term", help="term name, e.g. 2023-24")
+    archive.add_argument("start", help="first date, YYYY-MM-DD")
+    archive.add_argument("end", help="last date, YYYY-MM-DD")
+    archive.add_argument("--path", help="archive file, relative to the database's folder (default: archive/TERM.db)")
+    archive.add_argument("--no-vacuum", action="store_true", help="leave the live file at its current size")
+    archive.set_defaults(handler=cmd_archive)
+
+    archives = commands.add_parser("archives", help="list archived terms as CSV")
+    archives.set_defaults(handler=cmd_archives)
+
+    backups = commands.add_parser("backup", help="copy the live database into a timestamped snapshot")
+    backups.add_argument("directory")
+    backups.add_argument("--compress", action="store_true", help="gzip the snapshot")
+    backups.add_argument("--keep", type=int, help="delete all but the newest KEEP snapshots in the directory")
+    backups.add_argument("--pages", type=int, default=256, help="pages copied per step (default: %(default)s)")
+    backups.add_argument("--pause", type=float, default=0.01, help="seconds to wait between steps (default: %(default)s)")
+    backups.set_defaults(handler=cmd_backup)
+
+    verify = commands.add_parser("verify-backup", help="check snapshots against their .sha256 files")
+    verify.add_argument("paths", nargs="+")
+    verify.set_defaults(handler=cmd_verify_backup)
+
+    maintain = commands.add_parser("maintain", help="refresh statistics and check hot query plans")
+    maintain.add_argument("--analyze", action="store_true", help="run a full ANALYZE")
+    maintain.add_argument("--rebuild-rollups", action="store_true", help="recompute the monthly rollup table")
+    maintain.add_argument("--vacuum", action="store_true", help="compact the file, e.g. after a schema upgrade")
+    maintain.set_defaults(handler=cmd_maintain)
+
+    serve = commands.add_parser("serve", help="run the local attendance service for terminals sharing this database")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8757)
+    serve.set_defaults(handler=cmd_serve)
+    return parser
+
+def main(argv=None):
+    global db
+    args = build_parser().parse_args(argv)
+    if args.profile or args.trace_log:
+        instrument.enable(args.slow_ms, args.trace_log)
+    try:
+        if args.service:
+            import service
+            db = service.Client(*service.parse_address(args.service))
+        elif args.command != "serve":
+            database.configure(args.db)
+            database.setup_database()
+        return args.handler(args) or 0
+    except (ValueError, sqlite3.Error) as e:
+        # Bad dates, CSV headers or IDs: one line naming the problem rather than a traceback.
+        raise SystemExit(f"error: {e}")
+    except BrokenPipeError:
+        # The reader (e.g. `head`) went away; that is not an error for a streaming command.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    finally:
+        if args.profile:
+            print(instrument.format_stats(), file=sys.stderr)
+        instrument.disable()
+
+if __name__ == "__main__":
+    sys.exit(main())
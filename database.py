@@ -1,177 +1,1085 @@
+import itertools
+import json
+import os
+import re
 import sqlite3
+import threading
+from datetime import date as Date, timedelta
+import instrument
 
+DB_PATH = 'attendance.db'
+
+# Number of prepared statements each connection keeps compiled.
+STATEMENT_CACHE_SIZE = 256
+
+# Applied once when a pooled connection is opened, never per query.
+PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("foreign_keys", "ON"),
+    ("busy_timeout", 5000),
+    ("cache_size", -65536),     # negative values are KiB, i.e. a 64 MB page cache
+    ("mmap_size", 268435456),
+    ("temp_store", "MEMORY"),
+)
+
+STATUSES = ("Present", "Absent", "Late")
+
+_local = threading.local()
+_pool_lock = threading.Lock()
+_pool = []
+_generation = 0
+
+def configure(path=None):
+    """Points the connection pool at another database file and drops every pooled connection."""
+    global DB_PATH
+    if path is not None:
+        DB_PATH = path
+    close_connections()
+
+@instrument.timed("db.connect")
+def _connect():
+    conn = sqlite3.connect(DB_PATH, cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False,
+                           factory=instrument.Connection)
+    for name, value in PRAGMAS:
+        conn.execute(f"PRAGMA {name} = {value}")
+    conn.archives = {}  # archive_id -> schema name of the term archives attached so far
+    conn.archive_copies = []  # temp tables from _copy_archived_attendance() not yet dropped
+    return conn
+
+def get_connection():
+    """Returns the calling thread's pooled connection, opening it on first use."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.generation != _generation:
+        conn = _connect()
+        _local.conn, _local.generation = conn, _generation
+        with _pool_lock:
+            _pool.append(conn)
+    return conn
+
+def close_connections():
+    """Closes every pooled connection; threads reconnect lazily on their next call."""
+    global _generation
+    with _pool_lock:
+        _generation += 1
+        conns = list(_pool)
+        _pool.clear()
+    for conn in conns:
+        conn.close()
+    _local.__dict__.pop('conn', None)
+
+@instrument.timed("db.setup_database")
 def setup_database():
     """Sets up the database with tables for students, classes, enrollments, and attendance."""
-    conn = sqlite3.connect('attendance.db')
-    cursor = conn.cursor()
-    cursor.execute("PRAGMA foreign_keys = ON;")
-    
-    # Create tables
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS students (
-            student_id TEXT PRIMARY KEY, 
-            full_name TEXT NOT NULL
-        )''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS classes (
-            class_id INTEGER PRIMARY KEY AUTOINCREMENT, 
-            class_name TEXT UNIQUE NOT NULL
+    conn = get_connection()
+    with conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS students (
+                student_id TEXT PRIMARY KEY, 
+                full_name TEXT NOT NULL
+            )''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS classes (
+                class_id INTEGER PRIMARY KEY AUTOINCREMENT, 
+                class_name TEXT UNIQUE NOT NULL
+            )''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS enrollments (
+                enrollment_id INTEGER PRIMARY KEY AUTOINCREMENT, 
+                student_id TEXT NOT NULL,
+                class_id INTEGER NOT NULL,
+                FOREIGN KEY (student_id) REFERENCES students(student_id) ON DELETE CASCADE,
+                FOREIGN KEY (class_id) REFERENCES classes(class_id) ON DELETE CASCADE,
+                UNIQUE(student_id, class_id)
+            )''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS attendance (
+                attendance_id INTEGER PRIMARY KEY AUTOINCREMENT, 
+                student_id TEXT NOT NULL,
+                class_id INTEGER NOT NULL, 
+                date TEXT NOT NULL, 
+                status TEXT NOT NULL,
+                FOREIGN KEY (student_id) REFERENCES students(student_id) ON DELETE CASCADE,
+                FOREIGN KEY (class_id) REFERENCES classes(class_id) ON DELETE CASCADE
+            )''')
+        migrate(conn)
+
+def _migrate_attendance_unique(conn):
+    """Collapses duplicate marks (keeping the newest) so one row per student/class/date can be enforced."""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_attendance_unique'").fetchone()
+    if exists:
+        return
+    conn.execute('''
+        DELETE FROM attendance WHERE attendance_id NOT IN (
+            SELECT MAX(attendance_id) FROM attendance GROUP BY student_id, class_id, date
         )''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS enrollments (
-            enrollment_id INTEGER PRIMARY KEY AUTOINCREMENT, 
-            student_id TEXT NOT NULL,
+    conn.execute("CREATE UNIQUE INDEX idx_attendance_unique ON attendance (student_id, class_id, date)")
+
+def _migrate_covering_indexes(conn):
+    """Lets report range scans and roster lookups be answered from indexes alone."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_attendance_class_date ON attendance (class_id, date, student_id, status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_enrollments_class ON enrollments (class_id, student_id)")
+
+def _delete_orphaned_attendance(conn):
+    """Drops marks whose student or class no longer exists.
+
+    Databases written before foreign keys were enforced can hold them, and the
+    copies below into tables with foreign keys would fail on the first one.
+    """
+    conn.execute('''
+        DELETE FROM attendance
+        WHERE student_id NOT IN (SELECT student_id FROM students)
+           OR class_id NOT IN (SELECT class_id FROM classes)''')
+
+def _migrate_monthly_rollups(conn):
+    """Adds per (class, student, month) status counters that triggers keep in step with attendance."""
+    _delete_orphaned_attendance(conn)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS attendance_monthly (
             class_id INTEGER NOT NULL,
+            student_id TEXT NOT NULL,
+            month TEXT NOT NULL,
+            present INTEGER NOT NULL DEFAULT 0,
+            absent INTEGER NOT NULL DEFAULT 0,
+            late INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (class_id, month, student_id),
             FOREIGN KEY (student_id) REFERENCES students(student_id) ON DELETE CASCADE,
-            FOREIGN KEY (class_id) REFERENCES classes(class_id) ON DELETE CASCADE,
-            UNIQUE(student_id, class_id)
+            FOREIGN KEY (class_id) REFERENCES classes(class_id) ON DELETE CASCADE
+        ) WITHOUT ROWID''')
+    add = '''
+        INSERT INTO attendance_monthly (class_id, student_id, month, present, absent, late)
+        VALUES (new.class_id, new.student_id, substr(new.date, 1, 7),
+                new.status = 'Present', new.status = 'Absent', new.status = 'Late')
+        ON CONFLICT (class_id, month, student_id) DO UPDATE SET
+            present = present + excluded.present, absent = absent + excluded.absent, late = late + excluded.late;
+    '''
+    remove = '''
+        UPDATE attendance_monthly SET
+            present = present - (old.status = 'Present'),
+            absent = absent - (old.status = 'Absent'),
+            late = late - (old.status = 'Late')
+        WHERE class_id = old.class_id AND month = substr(old.date, 1, 7) AND student_id = old.student_id;
+    '''
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS attendance_rollup_insert AFTER INSERT ON attendance BEGIN {add} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS attendance_rollup_delete AFTER DELETE ON attendance BEGIN {remove} END")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS attendance_rollup_update
+        AFTER UPDATE OF student_id, class_id, date, status ON attendance BEGIN {remove} {add} END""")
+    conn.execute("DELETE FROM attendance_monthly")
+    conn.execute('''
+        INSERT INTO attendance_monthly (class_id, student_id, month, present, absent, late)
+        SELECT class_id, student_id, substr(date, 1, 7),
+               SUM(status = 'Present'), SUM(status = 'Absent'), SUM(status = 'Late')
+        FROM attendance
+        GROUP BY class_id, student_id, substr(date, 1, 7)''')
+
+def _migrate_compact_attendance(conn):
+    """Rewrites attendance as a WITHOUT ROWID table keyed (class_id, day, student_id) with integer day and status.
+
+    day is the Julian day number, which SQLite's date functions read directly, and
+    status is a code from attendance_status. The copy runs in the migration's single
+    transaction and leaves the old pages free until the next VACUUM.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS attendance_status (
+            code INTEGER PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL
         )''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS attendance (
-            attendance_id INTEGER PRIMARY KEY AUTOINCREMENT, 
+    _delete_orphaned_attendance(conn)
+    conn.executemany("INSERT OR IGNORE INTO attendance_status (code, name) VALUES (?, ?)", enumerate(STATUSES))
+    # Keep any status text written outside the app rather than dropping those rows.
+    conn.execute("INSERT OR IGNORE INTO attendance_status (name) SELECT DISTINCT status FROM attendance")
+    conn.execute('''
+        CREATE TABLE attendance_compact (
+            class_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
             student_id TEXT NOT NULL,
-            class_id INTEGER NOT NULL, 
-            date TEXT NOT NULL, 
-            status TEXT NOT NULL,
+            status INTEGER NOT NULL REFERENCES attendance_status(code),
+            PRIMARY KEY (class_id, day, student_id),
             FOREIGN KEY (student_id) REFERENCES students(student_id) ON DELETE CASCADE,
             FOREIGN KEY (class_id) REFERENCES classes(class_id) ON DELETE CASCADE
+        ) WITHOUT ROWID''')
+    conn.execute('''
+        INSERT INTO attendance_compact (class_id, day, student_id, status)
+        SELECT a.class_id, CAST(julianday(a.date) + 0.5 AS INTEGER), a.student_id, st.code
+        FROM attendance a JOIN attendance_status st ON st.name = a.status
+        ORDER BY 1, 2, 3''')
+    for trigger in ROLLUP_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DROP TABLE attendance")
+    conn.execute("ALTER TABLE attendance_compact RENAME TO attendance")
+    # Student deletes cascade into attendance; this keeps them from scanning the table.
+    conn.execute("CREATE INDEX idx_attendance_student ON attendance (student_id)")
+    _create_rollup_triggers(conn)
+    _rebuild_rollups(conn)
+
+def _migrate_rollup_student_index(conn):
+    """Lets student deletes cascade into attendance_monthly without scanning it."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_attendance_monthly_student ON attendance_monthly (student_id)")
+
+def _migrate_term_archives(conn):
+    """Adds the registry of term archives and stops new marks landing in an archived term.
+
+    archive_classes records which classes have had their rows moved out so far, so
+    reads of a part-archived term look in the right place for each class.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archives (
+            archive_id INTEGER PRIMARY KEY,
+            term TEXT UNIQUE NOT NULL,
+            path TEXT NOT NULL,
+            first_day INTEGER NOT NULL,
+            last_day INTEGER NOT NULL,
+            rows INTEGER NOT NULL DEFAULT 0
         )''')
-    
-    conn.commit()
-    conn.close()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archive_classes (
+            archive_id INTEGER NOT NULL REFERENCES archives(archive_id),
+            class_id INTEGER NOT NULL REFERENCES classes(class_id) ON DELETE CASCADE,
+            PRIMARY KEY (archive_id, class_id)
+        ) WITHOUT ROWID''')
+    guard = "WHEN EXISTS (SELECT 1 FROM archives WHERE new.day BETWEEN first_day AND last_day) " \
+            "BEGIN SELECT RAISE(ABORT, 'That date belongs to an archived term.'); END"
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS attendance_archived_insert BEFORE INSERT ON attendance {guard}")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS attendance_archived_update BEFORE UPDATE OF day ON attendance {guard}")
+    for trigger in ROLLUP_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    _create_rollup_triggers(conn)
+
+def _migrate_student_search(conn):
+    """Indexes student IDs and names for search-as-you-type, plus a name index for the unfiltered list.
+
+    students_search is an FTS5 index over the students table itself, kept current
+    by triggers, with prefix indexes so every keystroke is an index lookup. SQLite
+    builds without FTS5 get only the name index and search by prefix with LIKE.
+    """
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_students_name ON students (full_name, student_id)")
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS students_search USING fts5 (
+                student_id, full_name, content='students', content_rowid='rowid',
+                prefix='1 2 3', tokenize='unicode61 remove_diacritics 2'
+            )''')
+    except sqlite3.OperationalError:
+        return  # no FTS5 in this SQLite build
+    add = "INSERT INTO students_search (rowid, student_id, full_name) VALUES (new.rowid, new.student_id, new.full_name);"
+    remove = '''INSERT INTO students_search (students_search, rowid, student_id, full_name)
+                VALUES ('delete', old.rowid, old.student_id, old.full_name);'''
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS students_search_insert AFTER INSERT ON students BEGIN {add} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS students_search_delete AFTER DELETE ON students BEGIN {remove} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS students_search_update AFTER UPDATE ON students BEGIN {remove} {add} END")
+    conn.execute("INSERT INTO students_search (students_search) VALUES ('rebuild')")
+
+ROLLUP_TRIGGERS = ("attendance_rollup_insert", "attendance_rollup_delete", "attendance_rollup_update")
+
+# Schema migrations in order; the database's PRAGMA user_version records how many have run.
+MIGRATIONS = (
+    _migrate_attendance_unique,
+    _migrate_covering_indexes,
+    _migrate_monthly_rollups,
+    _migrate_compact_attendance,
+    _migrate_rollup_student_index,
+    _migrate_term_archives,
+    _migrate_student_search,
+)
+
+def schema_version(conn=None):
+    conn = conn or get_connection()
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn=None):
+    """Applies every migration newer than the database's user_version, each in its own transaction."""
+    conn = conn or get_connection()
+    version = schema_version(conn)
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        with conn:
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+    if version < len(MIGRATIONS):
+        optimize()
+    return len(MIGRATIONS) - version
 
+# Status codes as stored in attendance.status; the SQL below spells them out as 0, 1 and 2.
+STATUS_CODES = {name: code for code, name in enumerate(STATUSES)}
+
+# Julian day number of date.min; day numbers match SQLite's date(day) and julianday().
+JULIAN_OFFSET = 1721425
+
+def day_number(iso_date):
+    """Converts a YYYY-MM-DD string to the integer day stored in attendance.day."""
+    return Date.fromisoformat(iso_date).toordinal() + JULIAN_OFFSET
+
+def status_code(status):
+    try:
+        return STATUS_CODES[status]
+    except KeyError:
+        raise ValueError(f"Unknown attendance status {status!r}; expected one of {', '.join(STATUSES)}.") from None
+
+def _create_rollup_triggers(conn):
+    add = '''
+        INSERT INTO attendance_monthly (class_id, student_id, month, present, absent, late)
+        VALUES (new.class_id, new.student_id, strftime('%Y-%m', new.day), new.status = 0, new.status = 1, new.status = 2)
+        ON CONFLICT (class_id, month, student_id) DO UPDATE SET
+            present = present + excluded.present, absent = absent + excluded.absent, late = late + excluded.late;
+    '''
+    remove = '''
+        UPDATE attendance_monthly SET
+            present = present - (old.status = 0), absent = absent - (old.status = 1), late = late - (old.status = 2)
+        WHERE class_id = old.class_id AND month = strftime('%Y-%m', old.day) AND student_id = old.student_id;
+    '''
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS attendance_rollup_insert AFTER INSERT ON attendance BEGIN {add} END")
+    # Rows moved out to a term archive stay counted in the rollups.
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS attendance_rollup_delete AFTER DELETE ON attendance
+        WHEN NOT EXISTS (SELECT 1 FROM archives WHERE old.day BETWEEN first_day AND last_day) BEGIN {remove} END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS attendance_rollup_update
+        AFTER UPDATE OF student_id, class_id, day, status ON attendance BEGIN {remove} {add} END""")
+
+def _rebuild_rollups(conn, archived=False):
+    """Recomputes attendance_monthly; archived=True adds back temp.archived_monthly from _collect_archived_rollups()."""
+    conn.execute("DELETE FROM attendance_monthly")
+    conn.execute('''
+        INSERT INTO attendance_monthly (class_id, student_id, month, present, absent, late)
+        SELECT class_id, student_id, strftime('%Y-%m', day), SUM(status = 0), SUM(status = 1), SUM(status = 2)
+        FROM attendance
+        GROUP BY class_id, student_id, strftime('%Y-%m', day)''')
+    if archived:
+        conn.execute('''
+            INSERT INTO attendance_monthly (class_id, student_id, month, present, absent, late)
+            SELECT class_id, student_id, month, SUM(present), SUM(absent), SUM(late)
+            FROM temp.archived_monthly
+            WHERE student_id IN (SELECT student_id FROM students)
+            GROUP BY class_id, student_id, month
+            ON CONFLICT (class_id, month, student_id) DO UPDATE SET
+                present = present + excluded.present, absent = absent + excluded.absent, late = late + excluded.late''')
+
+def _collect_archived_rollups(conn):
+    """Counts the rows in every term archive into temp.archived_monthly, one archive attached at a time.
+
+    Runs outside a transaction (ATTACH cannot run inside one), so the rebuild itself
+    can then swap the rollups in a single transaction however many archives there are.
+    """
+    conn.execute("DROP TABLE IF EXISTS temp.archived_monthly")
+    conn.execute("CREATE TEMP TABLE archived_monthly (class_id, student_id, month, present, absent, late)")
+    archives = conn.execute("SELECT archive_id, path, first_day, last_day FROM archives").fetchall()
+    for archive_id, path, first_day, last_day in archives:
+        schema = _attach(conn, archive_id, path)
+        with conn:
+            conn.execute(f'''
+                INSERT INTO temp.archived_monthly
+                SELECT class_id, student_id, strftime('%Y-%m', day), SUM(status = 0), SUM(status = 1), SUM(status = 2)
+                FROM {schema}.attendance
+                WHERE class_id IN (SELECT class_id FROM archive_classes WHERE archive_id = ?)
+                  AND day BETWEEN ? AND ?
+                GROUP BY class_id, student_id, strftime('%Y-%m', day)''', (archive_id, first_day, last_day))
+
+@instrument.timed("db.rebuild_rollups")
+def rebuild_rollups():
+    """Recomputes the monthly rollup table from raw attendance, e.g. after a backfill with triggers bypassed."""
+    conn = get_connection()
+    _collect_archived_rollups(conn)
+    with conn:
+        _rebuild_rollups(conn, archived=True)
+
+@instrument.timed("db.load_attendance")
+def load_attendance(rows, chunk_size=50000):
+    """Bulk-loads historic (student_id, class_id, date, status) rows, e.g. a backfill.
+
+    Rows are committed in chunks. The per-row rollup triggers are dropped for the
+    load and the rollups rebuilt once at the end, which is far cheaper than
+    maintaining them row by row.
+    """
+    conn = get_connection()
+    _collect_archived_rollups(conn)
+    with conn:
+        for trigger in ROLLUP_TRIGGERS:
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    try:
+        batch = []
+        for student_id, class_id, date, status in rows:
+            batch.append((student_id, class_id, day_number(date), status_code(status)))
+            if len(batch) >= chunk_size:
+                with conn:
+                    conn.executemany(UPSERT_ATTENDANCE, batch)
+                batch = []
+        with conn:
+            conn.executemany(UPSERT_ATTENDANCE, batch)
+    finally:
+        with conn:
+            _create_rollup_triggers(conn)
+            _rebuild_rollups(conn, archived=True)
+
+@instrument.timed("db.optimize")
+def optimize(analyze=False):
+    """Refreshes planner statistics: a full ANALYZE, or the cheap PRAGMA optimize SQLite recommends on close."""
+    conn = get_connection()
+    conn.execute("ANALYZE" if analyze else "PRAGMA optimize")
+
+@instrument.timed("db.vacuum")
+def vacuum():
+    """Rewrites the database file without its free pages, e.g. after a migration or a large delete."""
+    conn = get_connection()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.execute("VACUUM")
+    # VACUUM may renumber the implicit rowids the student search index is keyed on.
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'students_search'").fetchone():
+        with conn:
+            conn.execute("INSERT INTO students_search (students_search) VALUES ('rebuild')")
+
+def explain_query_plan(sql, params=(), conn=None):
+    conn = conn or get_connection()
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()]
+
+def query_plans(conn=None):
+    """Returns the current plan for each hot query, keyed by name."""
+    return {name: explain_query_plan(sql, params, conn) for name, (sql, params) in HOT_QUERIES.items()}
+
+def _schema_copy():
+    """Builds an empty in-memory copy of the schema, so plans are judged without size statistics."""
+    copy = sqlite3.connect(':memory:')
+    schema = get_connection().execute(
+        "SELECT name, sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' ORDER BY type = 'index'"
+    ).fetchall()
+    # Virtual tables create their own shadow tables (e.g. students_search_data).
+    virtual = [name for name, sql in schema if sql.upper().startswith("CREATE VIRTUAL TABLE")]
+    for name, sql in schema:
+        if not any(name.startswith(table + "_") for table in virtual):
+            copy.execute(sql)
+    return copy
+
+def check_query_plans():
+    """Lists (query, plan step) pairs where a hot query would fall back to a full table scan.
+
+    Plans are taken against an empty copy of the schema: on a real but still tiny
+    database the planner rightly prefers scans, which would hide a missing index.
+    """
+    copy = _schema_copy()
+    try:
+        copy.execute("ATTACH DATABASE ':memory:' AS archive")
+        for statement in ARCHIVE_SCHEMA:
+            copy.execute(statement.format(schema="archive"))
+        plans = query_plans(copy)
+        plans.update({name: explain_query_plan(sql, params, copy) for name, (sql, params) in ARCHIVE_QUERIES.items()})
+        problems = []
+        for name, steps in plans.items():
+            # Scans of materialised CTEs and subqueries read temporary results, not tables.
+            temporary = {step.split()[-1] for step in steps if step.startswith(("MATERIALIZE", "CO-ROUTINE"))}
+            problems += [(name, step) for step in steps if step.startswith("SCAN")
+                         and "INDEX" not in step and step.split()[1] not in temporary]
+        return problems
+    finally:
+        copy.close()
+
+@instrument.timed("db.add_student")
 def add_student(student_id, full_name):
-    conn = sqlite3.connect('attendance.db')
-    cursor = conn.cursor()
+    conn = get_connection()
     try:
-        cursor.execute("INSERT INTO students (student_id, full_name) VALUES (?, ?)", (student_id, full_name))
-        conn.commit()
+        with conn:
+            conn.execute("INSERT INTO students (student_id, full_name) VALUES (?, ?)", (student_id, full_name))
         return True
     except sqlite3.IntegrityError:
         return False
-    finally:
-        conn.close()
 
+@instrument.timed("db.get_students")
 def get_students():
-    conn = sqlite3.connect('attendance.db')
+    return get_connection().execute("SELECT student_id, full_name FROM students ORDER BY full_name").fetchall()
+
+@instrument.timed("db.unknown_students")
+def unknown_students(student_ids):
+    """Returns those of student_ids with no student record, in the order given."""
+    return [student_id for (student_id,) in get_connection().execute(
+        "SELECT value FROM json_each(?) WHERE value NOT IN (SELECT student_id FROM students) ORDER BY key",
+        (json.dumps(list(student_ids)),))]
+
+STUDENTS_PAGE_QUERY = "SELECT student_id, full_name FROM students ORDER BY full_name, student_id LIMIT ?"
+
+SEARCH_STUDENTS_QUERY = '''
+    SELECT s.student_id, s.full_name
+    FROM students_search f
+    JOIN students s ON s.rowid = f.rowid
+    WHERE students_search MATCH ?
+    ORDER BY s.full_name, s.student_id
+    LIMIT ?
+'''
+
+@instrument.timed("db.search_students")
+def search_students(text, limit=200):
+    """Returns up to limit (student_id, full_name) rows whose ID or name has a word starting with each word of text.
+
+    Rows come in name order; an empty search returns the first page of all students.
+    """
+    words = re.findall(r"\w+", text)
+    conn = get_connection()
+    if not words:
+        return conn.execute(STUDENTS_PAGE_QUERY, (limit,)).fetchall()
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT student_id, full_name FROM students ORDER BY full_name")
-        return cursor.fetchall()
-    finally:
-        conn.close()
+        return conn.execute(SEARCH_STUDENTS_QUERY, (" ".join(f'"{word}"*' for word in words), limit)).fetchall()
+    except sqlite3.OperationalError:
+        # No FTS5 in this SQLite build: match the whole text as an ID or name prefix.
+        prefix = re.sub(r"([\\%_])", r"\\\1", text.strip()) + "%"
+        return conn.execute('''
+            SELECT student_id, full_name FROM students
+            WHERE full_name LIKE ? ESCAPE '\\' OR student_id LIKE ? ESCAPE '\\'
+            ORDER BY full_name, student_id LIMIT ?''', (prefix, prefix, limit)).fetchall()
 
+@instrument.timed("db.update_student")
 def update_student(original_student_id, new_full_name):
-    conn = sqlite3.connect('attendance.db')
-    try:
-        cursor = conn.cursor()
-        cursor.execute("UPDATE students SET full_name = ? WHERE student_id = ?", (new_full_name, original_student_id))
-        conn.commit()
-    finally:
-        conn.close()
+    conn = get_connection()
+    with conn:
+        conn.execute("UPDATE students SET full_name = ? WHERE student_id = ?", (new_full_name, original_student_id))
 
-def delete_student(student_id):
-    conn = sqlite3.connect('attendance.db')
-    try:
-        cursor = conn.cursor()
-        cursor.execute("PRAGMA foreign_keys = ON;")
-        cursor.execute("DELETE FROM students WHERE student_id = ?", (student_id,))
-        conn.commit()
-    finally:
-        conn.close()
+# Deletes one chunk of a student's or class's attendance from the live table or an attached archive;
+# {days} is empty for the live table and limits an archive to its own term's days.
+PURGE_CHUNK = '''
+    DELETE FROM {table} WHERE (class_id, day, student_id) IN (
+        SELECT class_id, day, student_id FROM {table} WHERE {column} = ?{days} LIMIT ?)
+'''
+
+ARCHIVE_DAYS = " AND day BETWEEN ? AND ?"
 
+def _count_attendance(conn, column, key):
+    """Counts a student's or class's attendance in the live table and in each term archive.
+
+    Returns (archive_id, path, days, rows) per table, the live one first with archive_id
+    None and no days; an archive's days are its term's (first_day, last_day), as files
+    may be shared. Archives are attached one at a time, so any number can be counted.
+    """
+    counts = [(None, None, (), conn.execute(f"SELECT COUNT(*) FROM main.attendance WHERE {column} = ?",
+                                            (key,)).fetchone()[0])]
+    archives = conn.execute("SELECT archive_id, path, first_day, last_day FROM archives ORDER BY archive_id").fetchall()
+    for archive_id, path, first_day, last_day in archives:
+        schema = _attach(conn, archive_id, path)
+        rows = conn.execute(f"SELECT COUNT(*) FROM {schema}.attendance WHERE {column} = ?{ARCHIVE_DAYS}",
+                            (key, first_day, last_day)).fetchone()[0]
+        counts.append((archive_id, path, (first_day, last_day), rows))
+    return counts
+
+def _purge(column, final_sql, key, progress, chunk_size):
+    """Deletes a parent row's attendance in committed chunks, then the row itself.
+
+    Each chunk is its own short transaction, so other writers get the lock in
+    between however long the history is. Rows in term archives go too, so a student
+    ID used again later starts with no history. progress(done, total) is called after
+    each chunk; raising from it stops the purge with the parent row still present,
+    and deleting again finishes the job.
+    """
+    conn = get_connection()
+    counts = _count_attendance(conn, column, key)
+    total = sum(rows for _, _, _, rows in counts)
+    done = 0
+    for archive_id, path, days, rows in counts:
+        table = f"{_attach(conn, archive_id, path)}.attendance" if archive_id else "main.attendance"
+        chunk_sql = PURGE_CHUNK.format(table=table, column=column, days=ARCHIVE_DAYS if days else "")
+        removed = 0
+        while removed < rows:
+            with conn:
+                deleted = conn.execute(chunk_sql, (key, *days, chunk_size)).rowcount
+                if archive_id:
+                    conn.execute("UPDATE archives SET rows = rows - ? WHERE archive_id = ?", (deleted, archive_id))
+            if not deleted:
+                break
+            removed += deleted
+            done += deleted
+            if progress:
+                progress(done, total)
+    with conn:
+        conn.execute(final_sql, (key,))
+    return done
+
+@instrument.timed("db.count_student_attendance")
+def count_student_attendance(student_id):
+    """Counts a student's marks, archived ones included."""
+    return sum(rows for _, _, _, rows in _count_attendance(get_connection(), "student_id", student_id))
+
+@instrument.timed("db.delete_student")
+def delete_student(student_id, progress=None, chunk_size=20000):
+    """Deletes a student with their enrollments and attendance; returns the number of attendance rows removed."""
+    return _purge("student_id", "DELETE FROM students WHERE student_id = ?", student_id, progress, chunk_size)
+
+@instrument.timed("db.add_class")
 def add_class(class_name):
-    conn = sqlite3.connect('attendance.db')
-    cursor = conn.cursor()
+    conn = get_connection()
     try:
-        cursor.execute("INSERT INTO classes (class_name) VALUES (?)", (class_name,))
-        conn.commit()
+        with conn:
+            conn.execute("INSERT INTO classes (class_name) VALUES (?)", (class_name,))
         return True
     except sqlite3.IntegrityError:
         return False
-    finally:
-        conn.close()
 
+@instrument.timed("db.get_classes")
 def get_classes():
-    conn = sqlite3.connect('attendance.db')
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT class_id, class_name FROM classes ORDER BY class_name")
-        return cursor.fetchall()
-    finally:
-        conn.close()
+    return get_connection().execute("SELECT class_id, class_name FROM classes ORDER BY class_name").fetchall()
 
+@instrument.timed("db.update_class")
 def update_class(class_id, new_class_name):
-    conn = sqlite3.connect('attendance.db')
-    try:
-        cursor = conn.cursor()
-        cursor.execute("UPDATE classes SET class_name = ? WHERE class_id = ?", (new_class_name, class_id))
-        conn.commit()
-    finally:
-        conn.close()
+    conn = get_connection()
+    with conn:
+        conn.execute("UPDATE classes SET class_name = ? WHERE class_id = ?", (new_class_name, class_id))
 
-def delete_class(class_id):
-    conn = sqlite3.connect('attendance.db')
-    try:
-        cursor = conn.cursor()
-        cursor.execute("PRAGMA foreign_keys = ON;")
-        cursor.execute("DELETE FROM classes WHERE class_id = ?", (class_id,))
-        conn.commit()
-    finally:
-        conn.close()
+@instrument.timed("db.count_class_attendance")
+def count_class_attendance(class_id):
+    """Counts a class's marks, archived ones included."""
+    return sum(rows for _, _, _, rows in _count_attendance(get_connection(), "class_id", class_id))
+
+@instrument.timed("db.delete_class")
+def delete_class(class_id, progress=None, chunk_size=20000):
+    """Deletes a class with its enrollments and attendance; returns the number of attendance rows removed."""
+    return _purge("class_id", "DELETE FROM classes WHERE class_id = ?", class_id, progress, chunk_size)
 
+@instrument.timed("db.enroll_student")
 def enroll_student(student_id, class_id):
-    conn = sqlite3.connect('attendance.db')
-    cursor = conn.cursor()
+    conn = get_connection()
     try:
-        cursor.execute("INSERT INTO enrollments (student_id, class_id) VALUES (?, ?)", (student_id, class_id))
-        conn.commit()
+        with conn:
+            conn.execute("INSERT INTO enrollments (student_id, class_id) VALUES (?, ?)", (student_id, class_id))
         return True
     except sqlite3.IntegrityError:
         return False
-    finally:
-        conn.close()
 
+# Term archives: closed terms' attendance moved out to one database file per term.
+# ATTACH allows 10 databases per connection; past this many, unneeded archives are detached first.
+MAX_ATTACHED_ARCHIVES = 8
+
+ARCHIVE_SOURCES_QUERY = '''
+    SELECT a.archive_id, a.path, a.first_day, a.last_day
+    FROM archive_classes c
+    JOIN archives a ON a.archive_id = c.archive_id
+    WHERE c.class_id = ? AND a.first_day <= ? AND a.last_day >= ?
+'''
+
+# Tables of a term archive; the student index keeps deletes and their counts from scanning the archive.
+ARCHIVE_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS {schema}.attendance_status (
+        code INTEGER PRIMARY KEY,
+        name TEXT UNIQUE NOT NULL
+    )''',
+    '''
+    CREATE TABLE IF NOT EXISTS {schema}.attendance (
+        class_id INTEGER NOT NULL,
+        day INTEGER NOT NULL,
+        student_id TEXT NOT NULL,
+        status INTEGER NOT NULL,
+        PRIMARY KEY (class_id, day, student_id)
+    ) WITHOUT ROWID''',
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_attendance_student ON attendance (student_id)",
+)
+
+def archive_path(path):
+    """Resolves an archive path as stored in the archives table; relative paths are relative to the live database."""
+    return os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), path)
+
+def _attach(conn, archive_id, path, keep=(), create=False):
+    """Attaches an archive to conn once and returns its schema name; must run outside a transaction."""
+    schema = conn.archives.get(archive_id)
+    if schema:
+        return schema
+    if len(conn.archives) >= MAX_ATTACHED_ARCHIVES:
+        for other in [other for other in conn.archives if other not in keep]:
+            try:
+                conn.execute(f"DETACH DATABASE {conn.archives[other]}")
+                del conn.archives[other]
+            except sqlite3.OperationalError:
+                pass  # still being read by an open cursor
+    file = archive_path(path)
+    if not create and not os.path.exists(file):
+        # ATTACH would quietly create an empty file in its place.
+        raise sqlite3.OperationalError(f"The term archive {file} is missing.")
+    schema = f"archive_{archive_id}"
+    conn.execute(f"ATTACH DATABASE ? AS {schema}", (file,))
+    conn.archives[archive_id] = schema
+    if not create:
+        _index_archive(conn, schema)
+    return schema
+
+def _index_archive(conn, schema):
+    """Adds the student index to an archive written before archives had one."""
+    names = {name for (name,) in conn.execute(
+        f"SELECT name FROM {schema}.sqlite_master WHERE name IN ('attendance', 'idx_attendance_student')")}
+    if names == {"attendance"}:
+        try:
+            conn.execute(ARCHIVE_SCHEMA[-1].format(schema=schema))
+        except sqlite3.OperationalError:
+            pass  # e.g. a read-only copy; reads work without it, deletes scan
+
+def _attendance_source(conn, class_id, first_day, last_day):
+    """Returns the table expression holding a class's attendance between two day numbers.
+
+    That is plain attendance unless part of the range has been archived, in which
+    case the archives it overlaps are attached and UNIONed in; SQLite pushes the
+    caller's class and day conditions down into each arm. A range over more archives
+    than can be attached at once reads them through _copy_archived_attendance().
+    """
+    archives = conn.execute(ARCHIVE_SOURCES_QUERY, (class_id, last_day, first_day)).fetchall()
+    if not archives:
+        return "attendance"
+    if len(archives) > MAX_ATTACHED_ARCHIVES:
+        return _copy_archived_attendance(conn, class_id, first_day, last_day, archives)
+    keep = {archive_id for archive_id, _, _, _ in archives}
+    schemas = [_attach(conn, archive_id, path, keep) for archive_id, path, _, _ in archives]
+    if len(archives) == 1 and archives[0][2] <= first_day and last_day <= archives[0][3]:
+        return f"{schemas[0]}.attendance"
+    # Each arm keeps to its own term's days, in case two terms share an archive file.
+    arms = ["SELECT class_id, day, student_id, status FROM main.attendance"] + [
+        f"SELECT class_id, day, student_id, status FROM {schema}.attendance WHERE day BETWEEN {first} AND {last}"
+        for schema, (_, _, first, last) in zip(schemas, archives)]
+    return "(" + " UNION ALL ".join(arms) + ")"
+
+_copy_numbers = itertools.count(1)
+
+def _copy_archived_attendance(conn, class_id, first_day, last_day, archives):
+    """Copies a class's archived rows in a range into a new temp table, attaching one archive at a time.
+
+    For ranges spanning more archives than can be attached together. Returns the live
+    table UNIONed with the copy. Copies made by earlier calls are dropped first, bar
+    any still being read by an open cursor.
+    """
+    for table in list(conn.archive_copies):
+        try:
+            conn.execute(f"DROP TABLE temp.{table}")
+            conn.archive_copies.remove(table)
+        except sqlite3.OperationalError:
+            pass  # still being read by an open cursor
+    table = f"archived_attendance_{next(_copy_numbers)}"
+    conn.execute(f"""
+        CREATE TEMP TABLE {table} (
+            class_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            student_id TEXT NOT NULL,
+            status INTEGER NOT NULL,
+            PRIMARY KEY (class_id, day, student_id)
+        ) WITHOUT ROWID""")
+    conn.archive_copies.append(table)
+    for archive_id, path, archive_first, archive_last in archives:
+        schema = _attach(conn, archive_id, path)
+        with conn:
+            conn.execute(f'''
+                INSERT OR IGNORE INTO temp.{table} (class_id, day, student_id, status)
+                SELECT class_id, day, student_id, status FROM {schema}.attendance
+                WHERE class_id = ? AND day BETWEEN ? AND ?''',
+                         (class_id, max(first_day, archive_first), min(last_day, archive_last)))
+    return f"(SELECT class_id, day, student_id, status FROM main.attendance UNION ALL " \
+           f"SELECT class_id, day, student_id, status FROM temp.{table})"
+
+@instrument.timed("db.archive_term")
+def archive_term(term, start_date, end_date, path=None, progress=None, compact=True):
+    """Moves every class's attendance between two dates out into a separate database file for the term.
+
+    The term is registered first, which stops new marks landing in it. Each class is
+    then copied into the archive and deleted from the live database; the monthly
+    rollups keep counting the moved rows. progress(done, total) is called per class;
+    raising from it stops the move, and archiving the term again resumes it. With
+    compact, the live file is vacuumed afterwards to give the space back. Returns the
+    number of rows moved.
+    """
+    if not term.strip():
+        raise ValueError("The term needs a name.")
+    first_day, last_day = day_number(start_date), day_number(end_date)
+    if first_day > last_day:
+        raise ValueError("The term must end on or after its first day.")
+    conn = get_connection()
+    with conn:
+        existing = conn.execute("SELECT archive_id, path, first_day, last_day FROM archives WHERE term = ?",
+                                (term,)).fetchone()
+        if existing:
+            if existing[2:] != (first_day, last_day):
+                raise ValueError(f"Term {term!r} is already archived with different dates.")
+            archive_id, path = existing[:2]
+        else:
+            overlap = conn.execute("SELECT term FROM archives WHERE first_day <= ? AND last_day >= ?",
+                                   (last_day, first_day)).fetchone()
+            if overlap:
+                raise ValueError(f"{start_date} to {end_date} overlaps the archived term {overlap[0]!r}.")
+            if path and conn.execute("SELECT 1 FROM archives WHERE path = ?", (path,)).fetchone():
+                raise ValueError(f"{path} already holds another term's archive.")
+            archive_id = conn.execute("INSERT INTO archives (term, path, first_day, last_day) VALUES (?, ?, ?, ?)",
+                                      (term, path or "", first_day, last_day)).lastrowid
+            if not path:
+                # The ID keeps names apart for terms that differ only in punctuation, e.g. "T 1" and "T-1".
+                path = os.path.join("archive", f"{archive_id}-" + re.sub(r"[^\w.-]+", "-", term).strip("-.") + ".db")
+                conn.execute("UPDATE archives SET path = ? WHERE archive_id = ?", (path, archive_id))
+    os.makedirs(os.path.dirname(archive_path(path)), exist_ok=True)
+    schema = _attach(conn, archive_id, path, create=True)
+    with conn:
+        for statement in ARCHIVE_SCHEMA:
+            conn.execute(statement.format(schema=schema))
+        conn.execute(f"INSERT OR IGNORE INTO {schema}.attendance_status SELECT code, name FROM main.attendance_status")
+    classes = [class_id for (class_id,) in conn.execute("SELECT class_id FROM classes ORDER BY class_id").fetchall()]
+    moved = 0
+    for done, class_id in enumerate(classes, start=1):
+        # Copy and delete are separate transactions: a commit across two databases is not
+        # atomic in WAL mode, and this order can only leave rows in both, never in neither.
+        with conn:
+            copied = conn.execute(f'''
+                INSERT OR REPLACE INTO {schema}.attendance (class_id, day, student_id, status)
+                SELECT class_id, day, student_id, status FROM main.attendance
+                WHERE class_id = ? AND day BETWEEN ? AND ?''', (class_id, first_day, last_day)).rowcount
+        if copied:
+            with conn:
+                conn.execute("DELETE FROM main.attendance WHERE class_id = ? AND day BETWEEN ? AND ?",
+                             (class_id, first_day, last_day))
+                conn.execute("INSERT OR IGNORE INTO archive_classes (archive_id, class_id) VALUES (?, ?)",
+                             (archive_id, class_id))
+            moved += copied
+        if progress:
+            progress(done, len(classes))
+    with conn:
+        conn.execute(f"""UPDATE archives SET rows = (
+            SELECT COUNT(*) FROM {schema}.attendance WHERE day BETWEEN ? AND ?) WHERE archive_id = ?""",
+                     (first_day, last_day, archive_id))
+    if compact:
+        vacuum()
+    return moved
+
+@instrument.timed("db.get_archives")
+def get_archives():
+    """Returns (term, first date, last date, rows, path) for each archived term, oldest first."""
+    return get_connection().execute(
+        "SELECT term, date(first_day), date(last_day), rows, path FROM archives ORDER BY first_day").fetchall()
+
+STUDENTS_BY_CLASS_QUERY = '''
+    SELECT s.student_id, s.full_name 
+    FROM enrollments e
+    CROSS JOIN students s ON s.student_id = e.student_id
+    WHERE e.class_id = ? 
+    ORDER BY s.full_name
+'''
+
+@instrument.timed("db.get_students_by_class")
 def get_students_by_class(class_id):
-    conn = sqlite3.connect('attendance.db')
-    try:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT s.student_id, s.full_name 
-            FROM students s 
-            JOIN enrollments e ON s.student_id = e.student_id
-            WHERE e.class_id = ? 
-            ORDER BY s.full_name
-        ''', (class_id,))
-        return cursor.fetchall()
-    finally:
-        conn.close()
+    return get_connection().execute(STUDENTS_BY_CLASS_QUERY, (class_id,)).fetchall()
 
+CLASS_ROSTER_QUERY = '''
+    SELECT s.student_id, s.full_name, st.name
+    FROM enrollments e
+    CROSS JOIN students s ON s.student_id = e.student_id
+    LEFT JOIN {attendance} a ON a.class_id = e.class_id AND a.day = ? AND a.student_id = e.student_id
+    LEFT JOIN attendance_status st ON st.code = a.status
+    WHERE e.class_id = ?
+    ORDER BY s.full_name
+'''
+
+@instrument.timed("db.get_class_roster")
+def get_class_roster(class_id, date):
+    """Returns (student_id, full_name, status) for each enrolled student; status is None when not yet marked."""
+    conn, day = get_connection(), day_number(date)
+    query = CLASS_ROSTER_QUERY.format(attendance=_attendance_source(conn, class_id, day, day))
+    return conn.execute(query, (day, class_id)).fetchall()
+
+UPSERT_ATTENDANCE = '''
+    INSERT INTO attendance (student_id, class_id, day, status) VALUES (?, ?, ?, ?)
+    ON CONFLICT (class_id, day, student_id) DO UPDATE SET status = excluded.status
+'''
+
+@instrument.timed("db.mark_attendance")
 def mark_attendance(student_id, class_id, date, status):
-    conn = sqlite3.connect('attendance.db')
-    cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT attendance_id FROM attendance WHERE student_id = ? AND class_id = ? AND date = ?", (student_id, class_id, date))
-        exists = cursor.fetchone()
-        if exists:
-            cursor.execute("UPDATE attendance SET status = ? WHERE attendance_id = ?", (status, exists[0]))
-        else:
-            cursor.execute("INSERT INTO attendance (student_id, class_id, date, status) VALUES (?, ?, ?, ?)", (student_id, class_id, date, status))
-        conn.commit()
-    finally:
-        conn.close()
+    conn = get_connection()
+    with conn:
+        conn.execute(UPSERT_ATTENDANCE, (student_id, class_id, day_number(date), status_code(status)))
+
+@instrument.timed("db.mark_attendance_bulk")
+def mark_attendance_bulk(class_id, date, marks, progress=None, chunk_size=1000):
+    """Writes a whole roster's (student_id, status) marks for one class and date in a single transaction.
+
+    progress(done, total) is called after each chunk; an exception raised from it rolls the save back.
+    """
+    day = day_number(date)
+    rows = [(student_id, class_id, day, status_code(status)) for student_id, status in marks]
+    conn = get_connection()
+    with conn:
+        for start in range(0, len(rows), chunk_size):
+            conn.executemany(UPSERT_ATTENDANCE, rows[start:start + chunk_size])
+            if progress:
+                progress(min(start + chunk_size, len(rows)), len(rows))
 
+@instrument.timed("db.mark_attendance_rows")
+def mark_attendance_rows(rows):
+    """Writes (student_id, class_id, date, status) marks for any mix of classes and dates in one transaction."""
+    rows = [(student_id, class_id, day_number(date), status_code(status)) for student_id, class_id, date, status in rows]
+    conn = get_connection()
+    with conn:
+        conn.executemany(UPSERT_ATTENDANCE, rows)
+
+ATTENDANCE_REPORT_QUERY = '''
+    SELECT s.student_id, s.full_name, date(a.day), st.name
+    FROM {attendance} a
+    JOIN students s ON a.student_id = s.student_id
+    JOIN attendance_status st ON st.code = a.status
+    WHERE a.class_id = ? AND a.day BETWEEN ? AND ?
+    ORDER BY a.day, s.full_name, s.student_id
+'''
+
+@instrument.timed("db.get_attendance_report")
 def get_attendance_report(class_id, start_date, end_date):
-    conn = sqlite3.connect('attendance.db')
+    conn, start, end = get_connection(), day_number(start_date), day_number(end_date)
+    query = ATTENDANCE_REPORT_QUERY.format(attendance=_attendance_source(conn, class_id, start, end))
+    return conn.execute(query, (class_id, start, end)).fetchall()
+
+def iter_attendance_report(class_id, start_date, end_date, batch_size=5000):
+    """Yields the report in fetchmany batches, so memory stays bounded however long the range is."""
+    conn, start, end = get_connection(), day_number(start_date), day_number(end_date)
+    query = ATTENDANCE_REPORT_QUERY.format(attendance=_attendance_source(conn, class_id, start, end))
+    cursor = conn.execute(query, (class_id, start, end))
     try:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT s.student_id, s.full_name, a.date, a.status 
-            FROM attendance a
-            JOIN students s ON a.student_id = s.student_id
-            WHERE a.class_id = ? AND a.date BETWEEN ? AND ?
-            ORDER BY a.date, s.full_name
-        ''', (class_id, start_date, end_date))
-        return cursor.fetchall()
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            yield batch
     finally:
-        conn.close()
\ No newline at end of file
+        cursor.close()
+
+REPORT_PAGE_QUERY = '''
+    SELECT s.student_id, s.full_name, date(a.day), st.name
+    FROM {attendance} a
+    JOIN students s ON a.student_id = s.student_id
+    JOIN attendance_status st ON st.code = a.status
+    WHERE a.class_id = ? AND a.day BETWEEN ? AND ?
+      AND (a.day > ? OR (a.day = ? AND (s.full_name, s.student_id) > (?, ?)))
+    ORDER BY a.day, s.full_name, s.student_id
+    LIMIT ?
+'''
+
+REPORT_FIRST_PAGE_QUERY = ATTENDANCE_REPORT_QUERY + "    LIMIT ?\n"
+
+@instrument.timed("db.get_attendance_report_page")
+def get_attendance_report_page(class_id, start_date, end_date, after=None, limit=500):
+    """Returns the next page of the report in (date, full_name, student_id) order.
+
+    after is the last row of the previous page (or None for the first page). Seeking
+    past it through the (class_id, date) index keeps every page as cheap as the first.
+    """
+    conn = get_connection()
+    start, end = day_number(start_date), day_number(end_date)
+    if after is None:
+        query = REPORT_FIRST_PAGE_QUERY.format(attendance=_attendance_source(conn, class_id, start, end))
+        return conn.execute(query, (class_id, start, end, limit)).fetchall()
+    student_id, full_name, day = after[0], after[1], day_number(after[2])
+    query = REPORT_PAGE_QUERY.format(attendance=_attendance_source(conn, class_id, max(start, day), end))
+    return conn.execute(query, (class_id, max(start, day), end, day, day, full_name, student_id, limit)).fetchall()
+
+@instrument.timed("db.count_attendance_report")
+def count_attendance_report(class_id, start_date, end_date):
+    conn, start, end = get_connection(), day_number(start_date), day_number(end_date)
+    source = _attendance_source(conn, class_id, start, end)
+    return conn.execute(f'''
+        SELECT COUNT(*) FROM {source} a JOIN students s ON s.student_id = a.student_id
+        WHERE a.class_id = ? AND a.day BETWEEN ? AND ?''', (class_id, start, end)).fetchone()[0]
+
+ATTENDANCE_SUMMARY_QUERY = '''
+    WITH counts (student_id, present, absent, late) AS (
+        SELECT student_id, present, absent, late
+        FROM attendance_monthly
+        WHERE class_id = ? AND month BETWEEN ? AND ?
+        UNION ALL
+        SELECT student_id, status = 0, status = 1, status = 2
+        FROM {attendance}
+        WHERE class_id = ? AND day BETWEEN ? AND ?
+        UNION ALL
+        SELECT student_id, status = 0, status = 1, status = 2
+        FROM {attendance}
+        WHERE class_id = ? AND day BETWEEN ? AND ?
+    )
+    SELECT s.student_id, s.full_name,
+           SUM(present), SUM(absent), SUM(late), SUM(present + absent + late),
+           ROUND(100.0 * SUM(present + late) / SUM(present + absent + late), 1)
+    FROM counts
+    JOIN students s ON counts.student_id = s.student_id
+    GROUP BY counts.student_id
+    HAVING SUM(present + absent + late) > 0
+    ORDER BY s.full_name, s.student_id
+'''
+
+DAILY_SUMMARY_QUERY = '''
+    SELECT date(a.day),
+           SUM(a.status = 0), SUM(a.status = 1), SUM(a.status = 2), SUM(a.status IN (0, 1, 2)),
+           ROUND(100.0 * SUM(a.status IN (0, 2)) / SUM(a.status IN (0, 1, 2)), 1)
+    FROM {attendance} a
+    JOIN students s ON s.student_id = a.student_id
+    WHERE a.class_id = ? AND a.day BETWEEN ? AND ?
+    GROUP BY a.day
+    HAVING SUM(a.status IN (0, 1, 2)) > 0
+    ORDER BY a.day
+'''
+
+def _split_months(start_date, end_date):
+    """Splits a date range into whole months and the partial-month edges on either side.
+
+    Returns (first_month, last_month, head, tail) where head and tail are (start, end)
+    day number ranges; empty pieces come back as inverted ranges that match nothing.
+    """
+    start, end = Date.fromisoformat(start_date), Date.fromisoformat(end_date)
+    first = start if start.day == 1 else (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    last_end = end if (end + timedelta(days=1)).day == 1 else end.replace(day=1) - timedelta(days=1)
+    start_day, end_day = start.toordinal() + JULIAN_OFFSET, end.toordinal() + JULIAN_OFFSET
+    if first > last_end:
+        return "9999-99", "0000-00", (start_day, end_day), (1, 0)
+    head = (start_day, first.toordinal() + JULIAN_OFFSET - 1)
+    tail = (last_end.toordinal() + JULIAN_OFFSET + 1, end_day)
+    return first.isoformat()[:7], last_end.isoformat()[:7], head, tail
+
+@instrument.timed("db.get_attendance_summary")
+def get_attendance_summary(class_id, start_date, end_date):
+    """Returns per-student (student_id, full_name, present, absent, late, total, attendance %) rows.
+
+    Late counts as attended. Whole months are read from the attendance_monthly rollup;
+    only the partial months at either end of the range touch raw attendance rows.
+    """
+    first_month, last_month, head, tail = _split_months(start_date, end_date)
+    conn = get_connection()
+    query = ATTENDANCE_SUMMARY_QUERY.format(
+        attendance=_attendance_source(conn, class_id, day_number(start_date), day_number(end_date)))
+    return conn.execute(query, (class_id, first_month, last_month, class_id, *head, class_id, *tail)).fetchall()
+
+@instrument.timed("db.get_daily_summary")
+def get_daily_summary(class_id, start_date, end_date):
+    """Returns the class-wide (date, present, absent, late, total, attendance %) rollup for each day.
+
+    Statuses outside STATUSES (e.g. written by other tools) are left out, as in the summary and matrix.
+    """
+    conn, start, end = get_connection(), day_number(start_date), day_number(end_date)
+    query = DAILY_SUMMARY_QUERY.format(attendance=_attendance_source(conn, class_id, start, end))
+    return conn.execute(query, (class_id, start, end)).fetchall()
+
+ATTENDANCE_MARKS_QUERY = '''
+    SELECT s.student_id, s.full_name, a.day, a.status
+    FROM {attendance} a
+    JOIN students s ON a.student_id = s.student_id
+    WHERE a.class_id = ? AND a.day BETWEEN ? AND ?
+    ORDER BY s.full_name, s.student_id, a.day
+'''
+
+@instrument.timed("db.get_attendance_marks")
+def get_attendance_marks(class_id, start_date, end_date):
+    """Returns raw (student_id, full_name, day number, status code) marks, student by student in name order.
+
+    This is the input matrix.build() turns into a student-by-date grid.
+    """
+    conn, start, end = get_connection(), day_number(start_date), day_number(end_date)
+    query = ATTENDANCE_MARKS_QUERY.format(attendance=_attendance_source(conn, class_id, start, end))
+    return conn.execute(query, (class_id, start, end)).fetchall()
+
+# Queries whose plans check_query_plans() guards against full scans; parameters are placeholders.
+# Report queries are checked against the live table, the form they take outside archived terms.
+HOT_QUERIES = {
+    "attendance_report": (ATTENDANCE_REPORT_QUERY.format(attendance="attendance"), (1, 0, 9999999)),
+    "attendance_report_page": (REPORT_PAGE_QUERY.format(attendance="attendance"), (1, 0, 9999999, 0, 0, "", "", 500)),
+    "attendance_summary": (ATTENDANCE_SUMMARY_QUERY.format(attendance="attendance"),
+                           (1, "0000-00", "9999-99", 1, 0, 0, 1, 9, 9)),
+    "daily_summary": (DAILY_SUMMARY_QUERY.format(attendance="attendance"), (1, 0, 9999999)),
+    "attendance_marks": (ATTENDANCE_MARKS_QUERY.format(attendance="attendance"), (1, 0, 9999999)),
+    "students_by_class": (STUDENTS_BY_CLASS_QUERY, (1,)),
+    "students_page": (STUDENTS_PAGE_QUERY, (200,)),
+    "class_roster": (CLASS_ROSTER_QUERY.format(attendance="attendance"), (0, 1)),
+    "mark_attendance": (UPSERT_ATTENDANCE, ("", 1, 0, 0)),
+    "purge_student_chunk": (PURGE_CHUNK.format(table="attendance", column="student_id", days=""), ("", 20000)),
+    "purge_class_chunk": (PURGE_CHUNK.format(table="attendance", column="class_id", days=""), (1, 20000)),
+}
+
+# The same for the queries run against each term archive, checked in an archive schema attached as "archive".
+ARCHIVE_QUERIES = {
+    "archive_student_count": (f"SELECT COUNT(*) FROM archive.attendance WHERE student_id = ?{ARCHIVE_DAYS}",
+                              ("", 0, 9999999)),
+    "archive_purge_student_chunk": (PURGE_CHUNK.format(table="archive.attendance", column="student_id",
+                                                       days=ARCHIVE_DAYS), ("", 0, 9999999, 20000)),
+    "archive_purge_class_chunk": (PURGE_CHUNK.format(table="archive.attendance", column="class_id",
+                                                     days=ARCHIVE_DAYS), (1, 0, 9999999, 20000)),
+}
@@ -0,0 +1,48 @@
+import csv
+import os
+import database
+import matrix
+
+REPORT_HEADERS = ("Student ID", "Full Name", "Date", "Status")
+SUMMARY_HEADERS = ("Student ID", "Full Name", "Present", "Absent", "Late", "Total", "Attendance %")
+DAILY_HEADERS = ("Date", "Present", "Absent", "Late", "Total", "Attendance %")
+
+def write_csv(path, headers, batches, total=0, progress=None):
+    """Writes row batches to path via a temporary file, so a failed or cancelled export leaves nothing behind."""
+    partial = path + '.part'
+    written = 0
+    try:
+        with open(partial, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(headers)
+            for batch in batches:
+                writer.writerows(batch)
+                written += len(batch)
+                if progress:
+                    progress(written, total)
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return written
+
+def export_attendance_report(path, class_id, start_date, end_date, progress=None, batch_size=5000, db=database):
+    """Streams a class's attendance report straight from the database into a CSV file; returns the row count."""
+    total = db.count_attendance_report(class_id, start_date, end_date) if progress else 0
+    batches = db.iter_attendance_report(class_id, start_date, end_date, batch_size)
+    return write_csv(path, REPORT_HEADERS, batches, total, progress)
+
+def export_attendance_summary(path, class_id, start_date, end_date, daily=False, progress=None, db=database):
+    """Writes the per-student summary (or the per-day class rollup) to a CSV file; returns the row count."""
+    if daily:
+        headers, rows = DAILY_HEADERS, db.get_daily_summary(class_id, start_date, end_date)
+    else:
+        headers, rows = SUMMARY_HEADERS, db.get_attendance_summary(class_id, start_date, end_date)
+    return write_csv(path, headers, [rows], len(rows), progress)
+
+def export_attendance_matrix(path, class_id, start_date, end_date, progress=None, db=database):
+    """Writes the student-by-date matrix, with totals, to a CSV file; returns the row count."""
+    grid = matrix.load(class_id, start_date, end_date, db)
+    rows = list(grid.rows())
+    return write_csv(path, grid.headers(), [rows], len(rows), progress)
@@ -0,0 +1,141 @@
+import csv
+import json
+import os
+import database
+
+class ImportResult:
+    """Counts of rows written plus every rejected row as (line number, row key, reason)."""
+    def __init__(self):
+        self.inserted = 0
+        self.conflicts = []
+
+    def reject(self, line, key, reason):
+        self.conflicts.append((line, key, reason))
+
+    def summary(self, limit=10):
+        lines = [f"{self.inserted} rows imported, {len(self.conflicts)} rejected."]
+        lines += [f"  line {line}: {key}: {reason}" for line, key, reason in sorted(self.conflicts)[:limit]]
+        if len(self.conflicts) > limit:
+            lines.append(f"  ... and {len(self.conflicts) - limit} more.")
+        return "\n".join(lines)
+
+def _normalise(name):
+    return name.strip().lower().replace(' ', '_')
+
+def _read_chunks(path, required, chunk_size, progress):
+    """Streams a CSV file as lists of (line number, row dict) with normalised column names.
+
+    Each entry in required is a column name, or a tuple of names any one of which will do.
+    """
+    size = os.path.getsize(path)
+    with open(path, newline='', encoding='utf-8-sig') as csvfile:
+        reader = csv.reader(csvfile)
+        header = [_normalise(name) for name in next(reader, [])]
+        alternatives = [name if isinstance(name, tuple) else (name,) for name in required]
+        missing = [" or ".join(names) for names in alternatives if not any(name in header for name in names)]
+        if missing:
+            raise ValueError(f"{path} is missing required column(s): {', '.join(missing)}")
+        chunk = []
+        for values in reader:
+            if not any(values):
+                continue
+            chunk.append((reader.line_num, dict(zip(header, (value.strip() for value in values)))))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+                if progress:
+                    progress(csvfile.buffer.tell() // 1024, size // 1024 or 1)
+        if chunk:
+            yield chunk
+    if progress:
+        progress(size // 1024 or 1, size // 1024 or 1)
+
+def _existing(conn, sql, keys):
+    """Runs a json_each membership query for a whole chunk of keys in one statement."""
+    return {row[0] if len(row) == 1 else tuple(row) for row in conn.execute(sql, (json.dumps(keys),))}
+
+def import_students(path, chunk_size=5000, progress=None):
+    """Imports a student_id,full_name CSV in chunked transactions, reporting rows it could not add."""
+    result = ImportResult()
+    conn = database.get_connection()
+    seen = set()
+    for chunk in _read_chunks(path, ("student_id", "full_name"), chunk_size, progress):
+        rows = []
+        for line, row in chunk:
+            student_id, full_name = row.get("student_id", ""), row.get("full_name", "")
+            if not student_id or not full_name:
+                result.reject(line, student_id, "student ID and full name are required")
+            elif student_id in seen:
+                result.reject(line, student_id, "duplicate student ID in file")
+            else:
+                seen.add(student_id)
+                rows.append((line, student_id, full_name))
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            taken = _existing(conn, "SELECT student_id FROM students WHERE student_id IN (SELECT value FROM json_each(?))",
+                              [student_id for _, student_id, _ in rows])
+            fresh = []
+            for line, student_id, full_name in rows:
+                if student_id in taken:
+                    result.reject(line, student_id, "student ID already exists")
+                else:
+                    fresh.append((student_id, full_name))
+            conn.executemany("INSERT INTO students (student_id, full_name) VALUES (?, ?)", fresh)
+        result.inserted += len(fresh)
+    return result
+
+def import_enrollments(path, create_classes=False, chunk_size=5000, progress=None):
+    """Imports a student_id CSV with a class_id or class_name column in chunked transactions.
+
+    Unknown class names are rejected unless create_classes is set, in which case they are added.
+    """
+    result = ImportResult()
+    conn = database.get_connection()
+    class_ids = {class_id for class_id, _ in database.get_classes()}
+    class_names = {name: class_id for class_id, name in database.get_classes()}
+    seen = set()
+    for chunk in _read_chunks(path, ("student_id", ("class_id", "class_name")), chunk_size, progress):
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = []
+            for line, row in chunk:
+                student_id, class_key = row.get("student_id", ""), row.get("class_id") or row.get("class_name", "")
+                if not student_id or not class_key:
+                    result.reject(line, student_id, "student ID and class are required")
+                    continue
+                class_id = _resolve_class(conn, row, class_ids, class_names, create_classes)
+                if class_id is None:
+                    result.reject(line, student_id, f"unknown class {class_key!r}")
+                elif (student_id, class_id) in seen:
+                    result.reject(line, student_id, "duplicate enrollment in file")
+                else:
+                    seen.add((student_id, class_id))
+                    rows.append((line, student_id, class_id))
+            known = _existing(conn, "SELECT student_id FROM students WHERE student_id IN (SELECT value FROM json_each(?))",
+                              [student_id for _, student_id, _ in rows])
+            enrolled = _existing(conn, '''
+                SELECT e.student_id, e.class_id FROM json_each(?) j
+                JOIN enrollments e ON e.student_id = json_extract(j.value, '$[0]') AND e.class_id = json_extract(j.value, '$[1]')
+            ''', [[student_id, class_id] for _, student_id, class_id in rows])
+            fresh = []
+            for line, student_id, class_id in rows:
+                if student_id not in known:
+                    result.reject(line, student_id, "unknown student ID")
+                elif (student_id, class_id) in enrolled:
+                    result.reject(line, student_id, "already enrolled in this class")
+                else:
+                    fresh.append((student_id, class_id))
+            conn.executemany("INSERT INTO enrollments (student_id, class_id) VALUES (?, ?)", fresh)
+        result.inserted += len(fresh)
+    return result
+
+def _resolve_class(conn, row, class_ids, class_names, create_classes):
+    if row.get("class_id"):
+        class_id = row["class_id"]
+        return int(class_id) if class_id.isdigit() and int(class_id) in class_ids else None
+    class_name = row["class_name"]
+    if class_name not in class_names and create_classes:
+        class_id = conn.execute("INSERT INTO classes (class_name) VALUES (?)", (class_name,)).lastrowid
+        class_names[class_name] = class_id
+        class_ids.add(class_id)
+    return class_names.get(class_name)
@@ -0,0 +1,162 @@
+"""Optional timing of database calls, SQL statements and UI population.
+
+Off by default. While off, every hook is a single flag check before calling straight
+through, so leaving the hooks in place costs next to nothing. Turn it on at runtime
+with enable(); timings accumulate per name until reset():
+
+    sql:<statement>   time to prepare and run a statement up to its first row
+    db.<function>     a whole database call, including fetching its rows
+    task.<key>        a background call from submission to its result arriving
+    ui.<key>          populating models and views with a result
+
+Anything slower than slow_ms is also kept as an event (with the EXPLAIN QUERY PLAN
+of slow SELECTs) and, when a log path is given, appended to it as a JSON line.
+"""
+import functools
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+
+enabled = False
+slow_ms = 100.0
+
+_lock = threading.Lock()
+_stats = {}
+_slow = deque(maxlen=200)
+_log = None
+
+def enable(slow_threshold_ms=100.0, log_path=None):
+    """Starts collecting timings; events slower than slow_threshold_ms are logged to log_path as JSON lines."""
+    global enabled, slow_ms, _log
+    with _lock:
+        if _log is not None:
+            _log.close()
+        _log = open(log_path, "a", encoding="utf-8") if log_path else None
+        slow_ms = slow_threshold_ms
+    enabled = True
+
+def disable():
+    global enabled, _log
+    enabled = False
+    with _lock:
+        if _log is not None:
+            _log.close()
+            _log = None
+
+def reset():
+    with _lock:
+        _stats.clear()
+        _slow.clear()
+
+def record(name, elapsed, rows=None, **details):
+    """Adds one timing (in seconds) under name; slow ones are also kept as events."""
+    ms = elapsed * 1000
+    with _lock:
+        entry = _stats.get(name)
+        if entry is None:
+            entry = _stats[name] = [0, 0.0, 0.0, 0]
+        entry[0] += 1
+        entry[1] += ms
+        entry[2] = max(entry[2], ms)
+        entry[3] += rows or 0
+        if ms < slow_ms:
+            return
+        event = {"time": time.time(), "name": name, "ms": round(ms, 3), "rows": rows,
+                 "thread": threading.current_thread().name, **details}
+        _slow.append(event)
+        if _log is not None:
+            _log.write(json.dumps(event) + "\n")
+            _log.flush()
+
+def stats():
+    """Returns (name, calls, total ms, mean ms, max ms, rows) tuples, slowest total first."""
+    with _lock:
+        items = [(name, calls, round(total, 3), round(total / calls, 3), round(peak, 3), rows)
+                 for name, (calls, total, peak, rows) in _stats.items()]
+    return sorted(items, key=lambda item: item[2], reverse=True)
+
+def slow_events():
+    with _lock:
+        return list(_slow)
+
+def export_json(path):
+    """Writes the aggregated stats and the slow events to path as one JSON document."""
+    headers = ("name", "calls", "total_ms", "mean_ms", "max_ms", "rows")
+    with open(path, "w", encoding="utf-8") as out:
+        json.dump({"stats": [dict(zip(headers, item)) for item in stats()], "slow": slow_events()}, out, indent=2)
+
+def format_stats(limit=30):
+    lines = [f"{'name':<48} {'calls':>7} {'total ms':>11} {'mean ms':>9} {'max ms':>9} {'rows':>9}"]
+    for name, calls, total, mean, peak, rows in stats()[:limit]:
+        lines.append(f"{name[:48]:<48} {calls:>7} {total:>11.1f} {mean:>9.2f} {peak:>9.2f} {rows:>9}")
+    return "\n".join(lines)
+
+def _count(result):
+    if isinstance(result, int) and not isinstance(result, bool):
+        return result
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+def timed(name):
+    """Decorator recording each call under name, with the length of the result as its row count."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            result = fn(*args, **kwargs)
+            record(name, time.perf_counter() - started, _count(result))
+            return result
+        return wrapper
+    return decorate
+
+class span:
+    """Context manager recording the time spent in its block under name, when enabled."""
+    def __init__(self, name):
+        self.name = name
+        self.started = None
+
+    def __enter__(self):
+        if enabled:
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.started is not None:
+            record(self.name, time.perf_counter() - self.started)
+
+def _statement_name(sql):
+    return "sql:" + " ".join(sql.split())[:120]
+
+class Connection(sqlite3.Connection):
+    """A sqlite3 connection that times execute() and executemany() while instrumentation is on."""
+    def execute(self, sql, parameters=()):
+        if not enabled:
+            return super().execute(sql, parameters)
+        started = time.perf_counter()
+        cursor = super().execute(sql, parameters)
+        elapsed = time.perf_counter() - started
+        details = {}
+        if elapsed * 1000 >= slow_ms and sql.lstrip()[:6].upper().startswith(("SELECT", "WITH")):
+            details["plan"] = self.plan(sql, parameters)
+        record(_statement_name(sql), elapsed, cursor.rowcount if cursor.rowcount > 0 else None, **details)
+        return cursor
+
+    def executemany(self, sql, parameters):
+        if not enabled:
+            return super().executemany(sql, parameters)
+        started = time.perf_counter()
+        cursor = super().executemany(sql, parameters)
+        record(_statement_name(sql), time.perf_counter() - started, cursor.rowcount if cursor.rowcount > 0 else None)
+        return cursor
+
+    def plan(self, sql, parameters=()):
+        try:
+            return [row[3] for row in super().execute("EXPLAIN QUERY PLAN " + sql, parameters)]
+        except sqlite3.Error as e:
+            return [f"unavailable: {e}"]
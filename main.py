@@ -1,12 +1,28 @@
+import argparse
+import os
 import sys
-import csv
+import time
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QTabWidget, QLabel, QLineEdit, QPushButton,
-                             QTableWidget, QTableWidgetItem, QComboBox,
+                             QTableView, QComboBox, QAbstractItemView,
                              QDateEdit, QHeaderView, QMessageBox, QDialog,
-                             QFormLayout, QDialogButtonBox, QMenu, QFileDialog)
-from PyQt6.QtCore import QDate, Qt
+                             QFormLayout, QDialogButtonBox, QMenu, QFileDialog,
+                             QProgressBar, QHBoxLayout, QCheckBox, QSpinBox)
+from PyQt6.QtCore import QDate, Qt, QTimer, pyqtSignal
+from PyQt6.QtGui import QShortcut, QKeySequence
 import database
+import instrument
+from models import RowTableModel, PagedTableModel, MatrixTableModel, AttendanceModel, StatusDelegate
+from workers import TaskRunner
+import checkin
+import importer
+import exporter
+import backup
+import matrix
+
+# Rows shown per student search, and how long typing must pause before it runs.
+STUDENT_SEARCH_LIMIT = 200
+SEARCH_DELAY_MS = 250
 
 # --- Modern UI Style Sheet (QSS) ---
 MODERN_STYLE = """
@@ -54,7 +70,7 @@ MODERN_STYLE = """
         border-radius: 4px;
         color: #e0e0e0;
     }
-    QTableWidget {
+    QTableView {
         background-color: #34495e;
         border: 1px solid #1a242f;
         gridline-color: #2c3e50;
@@ -110,12 +126,225 @@ class ClassDialog(QDialog):
     def get_data(self):
         return self.class_name_input.text()
 
+class EnrollDialog(QDialog):
+    """A dialog for enrolling a student in a class."""
+    def __init__(self, classes, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Enroll in Class")
+        layout = QFormLayout(self)
+        self.class_input = QComboBox()
+        for class_id, class_name in classes:
+            self.class_input.addItem(class_name, userData=class_id)
+        layout.addRow("Class:", self.class_input)
+        self.buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        self.buttons.accepted.connect(self.accept)
+        self.buttons.rejected.connect(self.reject)
+        layout.addWidget(self.buttons)
+
+    def get_data(self):
+        return self.class_input.currentData()
+
+class BackupDialog(QDialog):
+    """A dialog for choosing where and how to back the database up."""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Back Up Database")
+        layout = QFormLayout(self)
+        folder = QHBoxLayout()
+        self.folder_input = QLineEdit(os.path.abspath("backups"))
+        browse_button = QPushButton("Browse...")
+        browse_button.clicked.connect(self.browse)
+        folder.addWidget(self.folder_input)
+        folder.addWidget(browse_button)
+        layout.addRow("Folder:", folder)
+        self.compress_input = QCheckBox("Compress (gzip)")
+        layout.addRow(self.compress_input)
+        self.keep_input = QSpinBox(minimum=0, maximum=1000, value=14, specialValueText="All")
+        layout.addRow("Backups to keep:", self.keep_input)
+        self.buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        self.buttons.accepted.connect(self.accept)
+        self.buttons.rejected.connect(self.reject)
+        layout.addWidget(self.buttons)
+
+    def browse(self):
+        folder = QFileDialog.getExistingDirectory(self, "Back Up To", self.folder_input.text())
+        if folder:
+            self.folder_input.setText(folder)
+
+    def get_data(self):
+        return self.folder_input.text().strip(), self.compress_input.isChecked(), self.keep_input.value() or None
+
+class ArchiveDialog(QDialog):
+    """A dialog for moving a closed term's attendance out to an archive file."""
+    def __init__(self, archives, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Archive Term")
+        layout = QFormLayout(self)
+        self.term_input = QLineEdit()
+        self.start_input = QDateEdit(QDate.currentDate().addMonths(-6), calendarPopup=True)
+        self.end_input = QDateEdit(QDate.currentDate().addMonths(-1), calendarPopup=True)
+        layout.addRow("Term:", self.term_input)
+        layout.addRow("First Day:", self.start_input)
+        layout.addRow("Last Day:", self.end_input)
+        archived = "\n".join(f"{term}: {first} to {last} ({rows} records)" for term, first, last, rows, _ in archives)
+        layout.addRow("Archived:", QLabel(archived or "None yet"))
+        self.buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        self.buttons.accepted.connect(self.accept)
+        self.buttons.rejected.connect(self.reject)
+        layout.addWidget(self.buttons)
+
+    def get_data(self):
+        return (self.term_input.text().strip(), self.start_input.date().toString("yyyy-MM-dd"),
+                self.end_input.date().toString("yyyy-MM-dd"))
+
+class CheckInDialog(QDialog):
+    """A dialog that runs a QR badge check-in session from a camera or a recorded video."""
+    checked_in = pyqtSignal(str)
+    badge_rejected = pyqtSignal(str)
+
+    def __init__(self, class_id, date_str, roster_ids, parent=None, db=database):
+        super().__init__(parent)
+        self.setWindowTitle("QR Check-in")
+        self.class_id, self.date_str, self.roster_ids = class_id, date_str, roster_ids
+        self.db = db
+        self.pipeline = None
+        layout = QFormLayout(self)
+        self.source_input = QComboBox()
+        self.source_input.addItem("Camera", userData=0)
+        self.source_input.addItem("Video File...", userData=None)
+        layout.addRow("Source:", self.source_input)
+        self.status_label = QLabel("Ready.")
+        layout.addRow(self.status_label)
+        self.start_button = QPushButton("Start")
+        self.start_button.clicked.connect(self.toggle)
+        layout.addWidget(self.start_button)
+        self.count = 0
+        self.checked_in.connect(self.show_checkin)
+        self.badge_rejected.connect(lambda payload: self.status_label.setText(f"Not on this roster: {payload}"))
+        self.poll_timer = QTimer(self, interval=500)
+        self.poll_timer.timeout.connect(self.poll)
+
+    def toggle(self):
+        if self.pipeline:
+            self.stop()
+            return
+        source = self.source_input.currentData()
+        if source is None:
+            source, _ = QFileDialog.getOpenFileName(self, "Open Video", "", "Video Files (*.mp4 *.avi *.mkv *.mov)")
+            if not source:
+                return
+        self.pipeline = checkin.CheckInPipeline(source, self.class_id, self.date_str, roster_ids=self.roster_ids,
+                                                on_checkin=self.checked_in.emit, on_reject=self.badge_rejected.emit, db=self.db)
+        self.pipeline.start()
+        self.poll_timer.start()
+        self.start_button.setText("Stop")
+        self.status_label.setText("Scanning...")
+
+    def show_checkin(self, student_id):
+        self.count += 1
+        self.status_label.setText(f"Checked in {student_id} ({self.count} so far).")
+
+    def poll(self):
+        if self.pipeline and not self.pipeline.is_running():
+            self.stop()
+
+    def stop(self):
+        pipeline, self.pipeline = self.pipeline, None
+        self.poll_timer.stop()
+        self.start_button.setText("Start")
+        pipeline.stop()
+        try:
+            pipeline.wait(5)
+            self.status_label.setText(f"Stopped. {self.count} students checked in.")
+        except Exception as e:
+            QMessageBox.critical(self, "Check-in Error", f"An error occurred: {e}")
+
+    def done(self, result):
+        if self.pipeline:
+            self.stop()
+        super().done(result)
+
+class DiagnosticsDialog(QDialog):
+    """Shows the timings collected by the instrument module and switches collection on and off."""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Diagnostics")
+        self.resize(800, 500)
+        layout = QVBoxLayout(self)
+        form = QFormLayout()
+        self.enabled_input = QCheckBox("Collect timings")
+        self.enabled_input.setChecked(instrument.enabled)
+        self.enabled_input.toggled.connect(self.toggle)
+        form.addRow(self.enabled_input)
+        self.slow_input = QSpinBox(minimum=1, maximum=60000, value=int(instrument.slow_ms), suffix=" ms")
+        form.addRow("Log statements slower than:", self.slow_input)
+        layout.addLayout(form)
+        self.stats_model = RowTableModel(["Name", "Calls", "Total ms", "Mean ms", "Max ms", "Rows"])
+        layout.addWidget(make_table_view(self.stats_model))
+        self.slow_label = QLabel()
+        layout.addWidget(self.slow_label)
+        buttons = QHBoxLayout()
+        for label, slot in (("Refresh", self.refresh), ("Reset", self.reset), ("Export JSON...", self.export)):
+            button = QPushButton(label)
+            button.clicked.connect(slot)
+            buttons.addWidget(button)
+        layout.addLayout(buttons)
+        self.refresh()
+
+    def toggle(self, on):
+        if on:
+            instrument.enable(self.slow_input.value())
+        else:
+            instrument.disable()
+
+    def refresh(self):
+        self.stats_model.set_rows(instrument.stats())
+        self.slow_label.setText(f"{len(instrument.slow_events())} slow events recorded.")
+
+    def reset(self):
+        instrument.reset()
+        self.refresh()
+
+    def export(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Timings", "timings.json", "JSON Files (*.json)")
+        if path:
+            instrument.export_json(path)
+
+def make_table_view(model):
+    """Creates a table view tuned for large models: fixed row heights and no word wrapping."""
+    view = QTableView()
+    view.setModel(model)
+    view.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+    view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+    view.setWordWrap(False)
+    view.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+    view.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+    return view
+
 class AttendanceApp(QMainWindow):
-    def __init__(self):
+    def __init__(self, db=database):
         super().__init__()
         self.setWindowTitle("Class Attendance System")
         self.setGeometry(100, 100, 900, 700)
-        database.setup_database()
+        # db is the database module, or a service.Client when terminals share an attendance service.
+        self.db = db
+        self.importer = importer if db is database else db
+        self.backup = backup if db is database else db
+        self.db.setup_database()
+
+        self.classes_model = RowTableModel(["Class ID", "Class Name"])
+        self.students_model = RowTableModel(["Student ID", "Full Name"])
+        self.attendance_model = AttendanceModel()
+        self.report_model = PagedTableModel(exporter.REPORT_HEADERS)
+        self.summary_model = RowTableModel(exporter.SUMMARY_HEADERS)
+        self.daily_model = RowTableModel(exporter.DAILY_HEADERS)
+        self.matrix_model = MatrixTableModel()
+
+        self.tasks = TaskRunner(self, db=db)
+        self.progress_bar = QProgressBar(maximumWidth=200, textVisible=False)
+        self.progress_bar.hide()
+        self.statusBar().addPermanentWidget(self.progress_bar)
+        self.tasks.busy_changed.connect(self.show_busy)
 
         self.tabs = QTabWidget()
         self.setCentralWidget(self.tabs)
@@ -125,27 +354,40 @@ class AttendanceApp(QMainWindow):
         self.create_manage_students_tab()
         self.create_manage_classes_tab()
 
+        QShortcut(QKeySequence("Ctrl+Shift+D"), self, activated=self.show_diagnostics)
+
         self.refresh_all_data()
 
     def create_attendance_tab(self):
         tab, layout = QWidget(), QVBoxLayout()
         self.class_selector_att = QComboBox()
+        self.class_selector_att.setModel(self.classes_model)
+        self.class_selector_att.setModelColumn(1)
         self.class_selector_att.currentIndexChanged.connect(self.load_students_for_attendance)
         layout.addWidget(QLabel("Select Class:"))
         layout.addWidget(self.class_selector_att)
 
         self.date_edit_att = QDateEdit(calendarPopup=True, date=QDate.currentDate())
+        self.date_edit_att.dateChanged.connect(self.load_students_for_attendance)
         layout.addWidget(QLabel("Select Date:"))
         layout.addWidget(self.date_edit_att)
 
-        self.attendance_table = QTableWidget(columnCount=3)
-        self.attendance_table.setHorizontalHeaderLabels(["Student ID", "Full Name", "Status"])
-        self.attendance_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.attendance_table = make_table_view(self.attendance_model)
+        self.attendance_table.setItemDelegateForColumn(AttendanceModel.STATUS_COLUMN, StatusDelegate(self.attendance_table))
+        self.attendance_table.setEditTriggers(QAbstractItemView.EditTrigger.AllEditTriggers)
         layout.addWidget(self.attendance_table)
 
+        buttons = QHBoxLayout()
         save_button = QPushButton("Save Attendance")
         save_button.clicked.connect(self.save_attendance)
-        layout.addWidget(save_button)
+        buttons.addWidget(save_button)
+        checkin_button = QPushButton("QR Check-in...")
+        checkin_button.clicked.connect(self.start_checkin)
+        buttons.addWidget(checkin_button)
+        badges_button = QPushButton("Generate QR Badges...")
+        badges_button.clicked.connect(self.generate_badges)
+        buttons.addWidget(badges_button)
+        layout.addLayout(buttons)
 
         tab.setLayout(layout)
         self.tabs.addTab(tab, "Take Attendance")
@@ -153,6 +395,8 @@ class AttendanceApp(QMainWindow):
     def create_reports_tab(self):
         tab, layout = QWidget(), QVBoxLayout()
         self.class_selector_rep = QComboBox()
+        self.class_selector_rep.setModel(self.classes_model)
+        self.class_selector_rep.setModelColumn(1)
         layout.addWidget(QLabel("Filter by Class:"))
         layout.addWidget(self.class_selector_rep)
 
@@ -163,14 +407,22 @@ class AttendanceApp(QMainWindow):
         layout.addWidget(QLabel("End Date:"))
         layout.addWidget(self.end_date_rep)
 
+        self.report_mode = QComboBox()
+        self.report_mode.addItem("Detailed Records", userData="detail")
+        self.report_mode.addItem("Per-Student Summary", userData="summary")
+        self.report_mode.addItem("Daily Class Summary", userData="daily")
+        self.report_mode.addItem("Attendance Matrix", userData="matrix")
+        layout.addWidget(QLabel("Report Type:"))
+        layout.addWidget(self.report_mode)
+
         generate_button = QPushButton("Generate Report")
         generate_button.clicked.connect(self.generate_report)
         layout.addWidget(generate_button)
 
-        self.report_table = QTableWidget(columnCount=4)
-        self.report_table.setHorizontalHeaderLabels(["Student ID", "Full Name", "Date", "Status"])
-        self.report_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.report_table = make_table_view(self.report_model)
         layout.addWidget(self.report_table)
+        self.report_total_label = QLabel()
+        layout.addWidget(self.report_total_label)
 
         export_button = QPushButton("Export to CSV")
         export_button.clicked.connect(self.export_report_to_csv)
@@ -181,16 +433,31 @@ class AttendanceApp(QMainWindow):
 
     def create_manage_students_tab(self):
         tab, layout = QWidget(), QVBoxLayout()
+        buttons = QHBoxLayout()
         add_student_button = QPushButton("Add New Student")
         add_student_button.clicked.connect(self.add_student)
-        layout.addWidget(add_student_button)
-
-        self.students_table = QTableWidget(columnCount=2)
-        self.students_table.setHorizontalHeaderLabels(["Student ID", "Full Name"])
-        self.students_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        buttons.addWidget(add_student_button)
+        import_students_button = QPushButton("Import Students CSV...")
+        import_students_button.clicked.connect(self.import_students)
+        buttons.addWidget(import_students_button)
+        import_enrollments_button = QPushButton("Import Enrollments CSV...")
+        import_enrollments_button.clicked.connect(self.import_enrollments)
+        buttons.addWidget(import_enrollments_button)
+        layout.addLayout(buttons)
+
+        self.student_search_input = QLineEdit(placeholderText="Search by student ID or name")
+        self.student_search_input.setClearButtonEnabled(True)
+        self.student_search_timer = QTimer(self, singleShot=True, interval=SEARCH_DELAY_MS)
+        self.student_search_timer.timeout.connect(self.load_students)
+        self.student_search_input.textChanged.connect(self.student_search_timer.start)
+        layout.addWidget(self.student_search_input)
+
+        self.students_table = make_table_view(self.students_model)
         self.students_table.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.students_table.customContextMenuRequested.connect(self.open_student_menu)
         layout.addWidget(self.students_table)
+        self.student_search_label = QLabel()
+        layout.addWidget(self.student_search_label)
 
         tab.setLayout(layout)
         self.tabs.addTab(tab, "Manage Students")
@@ -206,70 +473,103 @@ class AttendanceApp(QMainWindow):
         form_layout.addWidget(add_class_button)
         layout.addLayout(form_layout)
 
-        self.classes_table = QTableWidget(columnCount=2)
-        self.classes_table.setHorizontalHeaderLabels(["Class ID", "Class Name"])
-        self.classes_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.classes_table = make_table_view(self.classes_model)
         self.classes_table.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.classes_table.customContextMenuRequested.connect(self.open_class_menu)
         layout.addWidget(self.classes_table)
 
+        maintenance = QHBoxLayout()
+        archive_button = QPushButton("Archive Term...")
+        archive_button.clicked.connect(self.archive_term)
+        maintenance.addWidget(archive_button)
+        backup_button = QPushButton("Back Up Database...")
+        backup_button.clicked.connect(self.back_up)
+        maintenance.addWidget(backup_button)
+        layout.addLayout(maintenance)
+
         tab.setLayout(layout)
         self.tabs.addTab(tab, "Manage Classes")
 
+    def run_db(self, key, fn, *args, on_result=None, **kwargs):
+        """Runs a database call on the worker pool; a newer call with the same key supersedes it."""
+        if instrument.enabled and on_result is not None:
+            on_result = self.timed_result(key or getattr(fn, '__name__', 'call'), on_result)
+        return self.tasks.submit(key, fn, *args, on_result=on_result, on_error=self.show_db_error,
+                                 on_progress=self.show_progress, **kwargs)
+
+    def timed_result(self, name, on_result):
+        """Wraps a result callback to record the task's round trip and the time spent populating the UI."""
+        submitted = time.perf_counter()
+
+        def populate(result):
+            instrument.record(f"task.{name}", time.perf_counter() - submitted)
+            with instrument.span(f"ui.{name}"):
+                on_result(result)
+        return populate
+
+    def show_diagnostics(self):
+        DiagnosticsDialog(self).exec()
+
+    def show_busy(self, busy):
+        self.progress_bar.setRange(0, 0)
+        self.progress_bar.setVisible(busy)
+
+    def show_progress(self, done, total):
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(done)
+
+    def show_db_error(self, error):
+        QMessageBox.critical(self, "Database Error", f"An error occurred: {error}")
+
+    def closeEvent(self, event):
+        self.tasks.shutdown()
+        super().closeEvent(event)
+
     def refresh_all_data(self):
         self.load_classes()
         self.load_students()
         self.load_students_for_attendance()
 
     def load_classes(self):
-        classes = database.get_classes()
-        self.class_selector_att.clear()
-        self.class_selector_rep.clear()
-        self.classes_table.setRowCount(0)
-        for class_id, class_name in classes:
-            self.class_selector_att.addItem(class_name, userData=class_id)
-            self.class_selector_rep.addItem(class_name, userData=class_id)
-            row = self.classes_table.rowCount()
-            self.classes_table.insertRow(row)
-            self.classes_table.setItem(row, 0, QTableWidgetItem(str(class_id)))
-            self.classes_table.setItem(row, 1, QTableWidgetItem(class_name))
+        # Both class selectors share classes_model, so one row-level update refreshes all three views.
+        self.run_db('classes', self.db.get_classes, on_result=self.classes_model.update_rows)
 
     def load_students(self):
-        students = database.get_students()
-        self.students_table.setRowCount(0)
-        for student_id, full_name in students:
-            row = self.students_table.rowCount()
-            self.students_table.insertRow(row)
-            self.students_table.setItem(row, 0, QTableWidgetItem(student_id))
-            self.students_table.setItem(row, 1, QTableWidgetItem(full_name))
+        """Shows the first page of students matching the search box; the search index keeps this fast at any size."""
+        self.student_search_timer.stop()
+
+        def found(rows):
+            self.students_model.update_rows(rows)
+            limited = len(rows) >= STUDENT_SEARCH_LIMIT
+            self.student_search_label.setText(
+                f"Showing the first {STUDENT_SEARCH_LIMIT} students; type to narrow the list." if limited else "")
+        self.run_db('students', self.db.search_students, self.student_search_input.text(), STUDENT_SEARCH_LIMIT,
+                    on_result=found)
 
     def load_students_for_attendance(self):
         class_id = self.class_selector_att.currentData()
         if not class_id:
-            self.attendance_table.setRowCount(0)
+            self.tasks.cancel('roster')
+            self.attendance_model.set_roster([])
             return
 
-        # Simplified: shows all students. For a real app, you'd use get_students_by_class(class_id).
-        students = database.get_students()
-        self.attendance_table.setRowCount(len(students))
-        for row, (student_id, full_name) in enumerate(students):
-            self.attendance_table.setItem(row, 0, QTableWidgetItem(student_id))
-            self.attendance_table.setItem(row, 1, QTableWidgetItem(full_name))
-            status_combo = QComboBox()
-            status_combo.addItems(["Present", "Absent", "Late"])
-            self.attendance_table.setCellWidget(row, 2, status_combo)
+        date_str = self.date_edit_att.date().toString("yyyy-MM-dd")
+        self.run_db('roster', self.db.get_class_roster, class_id, date_str, on_result=self.attendance_model.set_roster)
 
     def add_class(self):
         class_name = self.class_name_input.text().strip()
         if not class_name:
             QMessageBox.warning(self, "Input Error", "Class Name cannot be empty.")
             return
-        if database.add_class(class_name):
-            QMessageBox.information(self, "Success", f"Class '{class_name}' added.")
-            self.class_name_input.clear()
-            self.load_classes()
-        else:
-            QMessageBox.critical(self, "Database Error", f"Class '{class_name}' already exists.")
+
+        def added(ok):
+            if ok:
+                QMessageBox.information(self, "Success", f"Class '{class_name}' added.")
+                self.class_name_input.clear()
+                self.load_classes()
+            else:
+                QMessageBox.critical(self, "Database Error", f"Class '{class_name}' already exists.")
+        self.run_db(None, self.db.add_class, class_name, on_result=added)
 
     def open_class_menu(self, position):
         menu = QMenu()
@@ -282,30 +582,77 @@ class AttendanceApp(QMainWindow):
             self.delete_class()
 
     def edit_class(self):
-        row = self.classes_table.currentRow()
+        row = self.classes_table.currentIndex().row()
         if row < 0: return
-        class_id = int(self.classes_table.item(row, 0).text())
-        class_name = self.classes_table.item(row, 1).text()
+        class_id, class_name = self.classes_model.row(row)
         dialog = ClassDialog(class_name, self)
         if dialog.exec():
             new_name = dialog.get_data().strip()
             if new_name:
-                database.update_class(class_id, new_name)
-                self.load_classes()
-                QMessageBox.information(self, "Success", "Class updated.")
+                def updated(_):
+                    self.load_classes()
+                    QMessageBox.information(self, "Success", "Class updated.")
+                self.run_db(None, self.db.update_class, class_id, new_name, on_result=updated)
 
     def delete_class(self):
-        row = self.classes_table.currentRow()
+        row = self.classes_table.currentIndex().row()
         if row < 0: return
-        class_id = int(self.classes_table.item(row, 0).text())
-        class_name = self.classes_table.item(row, 1).text()
-        confirm = QMessageBox.question(self, "Confirm Delete",
-            f"Delete class '{class_name}'? All related records will be lost.",
-            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
-        if confirm == QMessageBox.StandardButton.Yes:
-            database.delete_class(class_id)
-            self.refresh_all_data()
-            QMessageBox.information(self, "Success", "Class deleted.")
+        class_id, class_name = self.classes_model.row(row)
+
+        def counted(records):
+            confirm = QMessageBox.question(self, "Confirm Delete",
+                f"Delete class '{class_name}'? All related records will be lost, "
+                f"including {records} attendance records.",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+            if confirm == QMessageBox.StandardButton.Yes:
+                def deleted(removed):
+                    self.load_classes()
+                    QMessageBox.information(self, "Success", f"Class deleted ({removed} attendance records removed).")
+                self.purge(self.db.delete_class, class_id, deleted, self.load_classes)
+        self.run_db(None, self.db.count_class_attendance, class_id, on_result=counted)
+
+    def archive_term(self):
+        def listed(archives):
+            dialog = ArchiveDialog(archives, self)
+            if not dialog.exec():
+                return
+            term, start_date, end_date = dialog.get_data()
+            if not term:
+                QMessageBox.warning(self, "Input Error", "Term cannot be empty.")
+                return
+            confirm = QMessageBox.question(self, "Confirm Archive",
+                f"Move all attendance from {start_date} to {end_date} into the '{term}' archive? "
+                "Reports still include it, but those dates can no longer be marked.",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+            if confirm == QMessageBox.StandardButton.Yes:
+                def archived(moved):
+                    QMessageBox.information(self, "Success", f"Term '{term}' archived ({moved} attendance records moved).")
+                self.tasks.submit(None, self.db.archive_term, term, start_date, end_date, progress=True,
+                                  on_result=archived, on_error=self.show_db_error, on_progress=self.show_progress)
+        self.run_db(None, self.db.get_archives, on_result=listed)
+
+    def back_up(self):
+        dialog = BackupDialog(self)
+        if not dialog.exec():
+            return
+        folder, compress, keep = dialog.get_data()
+        if not folder:
+            QMessageBox.warning(self, "Input Error", "Choose a folder for the backup.")
+            return
+
+        def backed_up(path):
+            QMessageBox.information(self, "Success", f"Database backed up to {path}.")
+        # Runs from a read snapshot in paced steps, so attendance can be taken meanwhile.
+        self.tasks.submit(None, self.backup.snapshot, folder, compress, keep, progress=True,
+                          on_result=backed_up, on_error=self.show_db_error, on_progress=self.show_progress)
+
+    def purge(self, fn, key, on_result, refresh):
+        """Runs a chunked delete in the background with progress; lists are refreshed even if it fails part-way."""
+        def failed(error):
+            refresh()
+            self.show_db_error(error)
+        self.tasks.submit(None, fn, key, progress=True, on_result=on_result, on_error=failed,
+                          on_progress=self.show_progress)
 
     def add_student(self):
         dialog = StudentDialog(parent=self)
@@ -314,47 +661,100 @@ class AttendanceApp(QMainWindow):
             if not student_id or not full_name:
                 QMessageBox.warning(self, "Input Error", "All fields are required.")
                 return
-            if database.add_student(student_id, full_name):
-                self.load_students()
-                self.load_students_for_attendance()
-                QMessageBox.information(self, "Success", "Student added.")
-            else:
-                QMessageBox.critical(self, "Database Error", "Student ID already exists.")
+
+            def added(ok):
+                if ok:
+                    self.load_students()
+                    QMessageBox.information(self, "Success", "Student added.")
+                else:
+                    QMessageBox.critical(self, "Database Error", "Student ID already exists.")
+            self.run_db(None, self.db.add_student, student_id, full_name, on_result=added)
 
     def open_student_menu(self, position):
         menu = QMenu()
         edit_action = menu.addAction("Edit Student")
+        enroll_action = menu.addAction("Enroll in Class")
         delete_action = menu.addAction("Delete Student")
         action = menu.exec(self.students_table.mapToGlobal(position))
         if action == edit_action:
             self.edit_student()
+        elif action == enroll_action:
+            self.enroll_student()
         elif action == delete_action:
             self.delete_student()
 
     def edit_student(self):
-        row = self.students_table.currentRow()
+        row = self.students_table.currentIndex().row()
         if row < 0: return
-        student_id = self.students_table.item(row, 0).text()
-        full_name = self.students_table.item(row, 1).text()
+        student_id, full_name = self.students_model.row(row)
         dialog = StudentDialog(student_id, full_name, self)
         if dialog.exec():
             _, new_full_name = dialog.get_data()
-            database.update_student(student_id, new_full_name)
-            self.refresh_all_data()
-            QMessageBox.information(self, "Success", "Student details updated.")
+
+            def updated(_):
+                self.load_students()
+                self.load_students_for_attendance()
+                QMessageBox.information(self, "Success", "Student details updated.")
+            self.run_db(None, self.db.update_student, student_id, new_full_name, on_result=updated)
+
+    def enroll_student(self):
+        row = self.students_table.currentIndex().row()
+        if row < 0: return
+        student_id = self.students_model.row(row)[0]
+        dialog = EnrollDialog(self.classes_model.rows(), self)
+        if dialog.exec():
+            class_id = dialog.get_data()
+            if not class_id:
+                return
+
+            def enrolled(ok):
+                if ok:
+                    if class_id == self.class_selector_att.currentData():
+                        self.load_students_for_attendance()
+                    QMessageBox.information(self, "Success", "Student enrolled.")
+                else:
+                    QMessageBox.critical(self, "Database Error", "Student is already enrolled in this class.")
+            self.run_db(None, self.db.enroll_student, student_id, class_id, on_result=enrolled)
 
     def delete_student(self):
-        row = self.students_table.currentRow()
+        row = self.students_table.currentIndex().row()
         if row < 0: return
-        student_id = self.students_table.item(row, 0).text()
-        confirm = QMessageBox.question(self, "Confirm Delete",
-            f"Delete student {student_id}? All related records will be lost.",
+        student_id = self.students_model.row(row)[0]
+
+        def counted(records):
+            confirm = QMessageBox.question(self, "Confirm Delete",
+                f"Delete student {student_id}? All related records will be lost, "
+                f"including {records} attendance records.",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+            if confirm == QMessageBox.StandardButton.Yes:
+                def deleted(removed):
+                    self.load_students()
+                    self.load_students_for_attendance() # This line fixes the refresh bug
+                    QMessageBox.information(self, "Success", f"Student deleted ({removed} attendance records removed).")
+                self.purge(self.db.delete_student, student_id, deleted, self.refresh_all_data)
+        self.run_db(None, self.db.count_student_attendance, student_id, on_result=counted)
+
+    def import_students(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Import Students", "", "CSV Files (*.csv)")
+        if path:
+            self.run_db('import', self.importer.import_students, path, progress=True, on_result=self.imported)
+
+    def import_enrollments(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Import Enrollments", "", "CSV Files (*.csv)")
+        if not path:
+            return
+        create = QMessageBox.question(self, "Import Enrollments",
+            "Create classes named in the file that do not exist yet?",
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
-        if confirm == QMessageBox.StandardButton.Yes:
-            database.delete_student(student_id)
-            self.load_students()
-            self.load_students_for_attendance() # This line fixes the refresh bug
-            QMessageBox.information(self, "Success", "Student deleted.")
+        self.run_db('import', self.importer.import_enrollments, path, progress=True,
+                    create_classes=create == QMessageBox.StandardButton.Yes, on_result=self.imported)
+
+    def imported(self, result):
+        self.refresh_all_data()
+        if result.conflicts:
+            QMessageBox.warning(self, "Import Finished", result.summary())
+        else:
+            QMessageBox.information(self, "Import Finished", result.summary())
 
     def save_attendance(self):
         class_id = self.class_selector_att.currentData()
@@ -362,11 +762,30 @@ class AttendanceApp(QMainWindow):
             QMessageBox.warning(self, "Selection Error", "Please select a class.")
             return
         date_str = self.date_edit_att.date().toString("yyyy-MM-dd")
-        for row in range(self.attendance_table.rowCount()):
-            student_id = self.attendance_table.item(row, 0).text()
-            status = self.attendance_table.cellWidget(row, 2).currentText()
-            database.mark_attendance(student_id, class_id, date_str, status)
-        QMessageBox.information(self, "Success", "Attendance saved successfully.")
+        self.run_db('save', self.db.mark_attendance_bulk, class_id, date_str, self.attendance_model.marks(), progress=True,
+                    on_result=lambda _: QMessageBox.information(self, "Success", "Attendance saved successfully."))
+
+    def start_checkin(self):
+        class_id = self.class_selector_att.currentData()
+        if not class_id:
+            QMessageBox.warning(self, "Selection Error", "Please select a class.")
+            return
+        date_str = self.date_edit_att.date().toString("yyyy-MM-dd")
+        roster_ids = {row[0] for row in self.attendance_model.rows()}
+        dialog = CheckInDialog(class_id, date_str, roster_ids, self, self.db)
+        dialog.checked_in.connect(lambda student_id: self.attendance_model.set_status(student_id, "Present"))
+        dialog.exec()
+
+    def generate_badges(self):
+        students = [row[:2] for row in self.attendance_model.rows()]
+        if not students:
+            QMessageBox.warning(self, "Selection Error", "Please select a class with enrolled students.")
+            return
+        out_dir = QFileDialog.getExistingDirectory(self, "Save Badges To")
+        if out_dir:
+            self.run_db('badges', checkin.generate_badges, students, out_dir, progress=True,
+                        on_result=lambda paths: QMessageBox.information(
+                            self, "Success", f"{len(paths)} badges saved to {out_dir}."))
 
     def generate_report(self):
         class_id = self.class_selector_rep.currentData()
@@ -375,37 +794,84 @@ class AttendanceApp(QMainWindow):
             return
         start_date = self.start_date_rep.date().toString("yyyy-MM-dd")
         end_date = self.end_date_rep.date().toString("yyyy-MM-dd")
-        report_data = database.get_attendance_report(class_id, start_date, end_date)
-        self.report_table.setRowCount(0)
-        for row_data in report_data:
-            row = self.report_table.rowCount()
-            self.report_table.insertRow(row)
-            for col, item in enumerate(row_data):
-                self.report_table.setItem(row, col, QTableWidgetItem(str(item)))
+        mode = self.report_mode.currentData()
+        if mode == "matrix":
+            legend = ", ".join(f"{code} = {status}" for code, status in zip(matrix.CODES, database.STATUSES))
+
+            def built(grid):
+                self.matrix_model.set_matrix(grid)
+                self.report_table.setModel(self.matrix_model)
+                self.report_total_label.setText(f"{len(grid.students)} students over {len(grid.days)} days ({legend})")
+            self.run_db('report', matrix.load, class_id, start_date, end_date, db=self.db, on_result=built)
+            return
+        if mode != "detail":
+            model = self.daily_model if mode == "daily" else self.summary_model
+            fn = self.db.get_daily_summary if mode == "daily" else self.db.get_attendance_summary
+
+            def summarised(rows):
+                model.set_rows(rows)
+                self.report_table.setModel(model)
+                self.report_total_label.setText(f"{len(rows)} {'days' if mode == 'daily' else 'students'}")
+            self.run_db('report', fn, class_id, start_date, end_date, on_result=summarised)
+            return
+
+        page_size = self.report_model.page_size
+
+        def fetch_page(after, on_page):
+            self.run_db('report', self.db.get_attendance_report_page, class_id, start_date, end_date, after, page_size,
+                        on_result=on_page)
+
+        def first_page():
+            return (self.db.count_attendance_report(class_id, start_date, end_date),
+                    self.db.get_attendance_report_page(class_id, start_date, end_date, None, page_size))
+
+        def loaded(result):
+            total, page = result
+            self.report_model.set_source(fetch_page, page, total)
+            self.report_table.setModel(self.report_model)
+            self.report_total_label.setText(f"{total} records")
+        self.run_db('report', first_page, on_result=loaded)
 
     def export_report_to_csv(self):
-        if self.report_table.rowCount() == 0:
-            QMessageBox.warning(self, "Export Error", "No report data to export.")
+        class_id = self.class_selector_rep.currentData()
+        if not class_id:
+            QMessageBox.warning(self, "Selection Error", "Please select a class.")
             return
+        start_date = self.start_date_rep.date().toString("yyyy-MM-dd")
+        end_date = self.end_date_rep.date().toString("yyyy-MM-dd")
         path, _ = QFileDialog.getSaveFileName(self, "Save CSV", "", "CSV Files (*.csv)")
         if path:
-            try:
-                with open(path, 'w', newline='') as csvfile:
-                    writer = csv.writer(csvfile)
-                    headers = [self.report_table.horizontalHeaderItem(i).text() for i in range(self.report_table.columnCount())]
-                    writer.writerow(headers)
-                    for row in range(self.report_table.rowCount()):
-                        row_data = [self.report_table.item(row, col).text() for col in range(self.report_table.columnCount())]
-                        writer.writerow(row_data)
-                QMessageBox.information(self, "Success", "Report exported successfully.")
-            except Exception as e:
-                QMessageBox.critical(self, "Export Error", f"An error occurred: {e}")
+            mode = self.report_mode.currentData()
+            if mode == "detail":
+                job, kwargs = exporter.export_attendance_report, {}
+            elif mode == "matrix":
+                job, kwargs = exporter.export_attendance_matrix, {}
+            else:
+                job, kwargs = exporter.export_attendance_summary, {"daily": mode == "daily"}
+            self.tasks.submit('export', job, path, class_id, start_date, end_date, **kwargs, db=self.db,
+                              progress=True, on_progress=self.show_progress,
+                              on_result=lambda count: QMessageBox.information(
+                                  self, "Success", f"Report exported successfully ({count} rows)."),
+                              on_error=lambda e: QMessageBox.critical(self, "Export Error", f"An error occurred: {e}"))
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="Class attendance system.")
+    parser.add_argument("--db", default=database.DB_PATH, help="database file (default: %(default)s)")
+    parser.add_argument("--service", metavar="HOST:PORT", help="use a running attendance service instead of the file")
+    args, qt_args = parser.parse_known_args()
+    app = QApplication(sys.argv[:1] + qt_args)
     app.setStyleSheet(MODERN_STYLE)
 
-    main_window = AttendanceApp()
+    if args.service:
+        import service
+        db = service.Client(*service.parse_address(args.service))
+    else:
+        database.configure(args.db)
+        db = database
+    main_window = AttendanceApp(db)
     main_window.show()
 
-    sys.exit(app.exec())
\ No newline at end of file
+    exit_code = app.exec()
+    if db is database:
+        database.optimize()
+    sys.exit(exit_code)
\ No newline at end of file
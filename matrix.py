@@ -0,0 +1,105 @@
+"""Student-by-date attendance grids for long reports.
+
+A class's marks over a range come from one query ordered by student and date,
+and are laid into a flat array of one status byte per (student, day), with the
+per-student and per-day counts tallied in the same pass. A semester for a full
+class is a few tens of thousands of bytes, and every cell is an index lookup.
+"""
+from array import array
+from datetime import date as Date
+import database
+
+NO_MARK = 255
+
+# One-letter cell codes, in status code order: P, A, L.
+CODES = tuple(status[0] for status in database.STATUSES)
+
+TOTAL_HEADERS = ("Present", "Absent", "Late", "Total", "Attendance %")
+
+def _totals(counts):
+    present, absent, late = counts
+    total = present + absent + late
+    if not total:
+        return present, absent, late, total, None
+    # Late counts as attended, as in the summaries; halves round up like SQLite's ROUND() there.
+    return present, absent, late, total, int(1000.0 * (present + late) / total + 0.5) / 10
+
+class AttendanceMatrix:
+    """Status codes for students x days in a flat array, plus per-student and per-day counts.
+
+    Columns are only the days on which the class has at least one mark.
+    """
+    def __init__(self, students, first_day, width, cells, student_counts, day_counts):
+        self.students = students
+        self.first_day, self.width = first_day, width
+        self._cells = cells
+        self._student_counts, self._day_counts = student_counts, day_counts
+        statuses = len(CODES)
+        self.days = [offset for offset in range(width) if any(day_counts[offset * statuses:(offset + 1) * statuses])]
+
+    def dates(self):
+        return [Date.fromordinal(self.first_day + offset - database.JULIAN_OFFSET).isoformat() for offset in self.days]
+
+    def status(self, row, column):
+        """Returns the status code in a cell, or None where the student has no mark that day."""
+        code = self._cells[row * self.width + self.days[column]]
+        return None if code == NO_MARK else code
+
+    def code(self, row, column):
+        code = self.status(row, column)
+        return "" if code is None or code >= len(CODES) else CODES[code]
+
+    def student_totals(self, row):
+        """Returns (present, absent, late, total, attendance %) for one student."""
+        statuses = len(CODES)
+        return _totals(self._student_counts[row * statuses:(row + 1) * statuses])
+
+    def day_totals(self, column):
+        """Returns (present, absent, late, total, attendance %) for one day across the class."""
+        statuses = len(CODES)
+        offset = self.days[column]
+        return _totals(self._day_counts[offset * statuses:(offset + 1) * statuses])
+
+    def headers(self):
+        return ("Student ID", "Full Name", *self.dates(), *TOTAL_HEADERS)
+
+    def rows(self):
+        """Yields the grid as export rows: one per student, then the class's attendance % per day."""
+        for row, (student_id, full_name) in enumerate(self.students):
+            yield (student_id, full_name, *(self.code(row, column) for column in range(len(self.days))),
+                   *self.student_totals(row))
+        if self.students:
+            class_counts = [sum(self._student_counts[status::len(CODES)]) for status in range(len(CODES))]
+            yield ("", "Attendance %", *(self.day_totals(column)[4] for column in range(len(self.days))),
+                   *_totals(class_counts))
+
+def build(marks, start_date, end_date):
+    """Builds a matrix from (student_id, full_name, day number, status code) marks grouped by student.
+
+    Statuses outside STATUSES (e.g. written by other tools) show in no total.
+    """
+    first_day = database.day_number(start_date)
+    width = database.day_number(end_date) - first_day + 1
+    statuses = len(CODES)
+    students = []
+    cells = array('B')
+    blank = array('B', [NO_MARK]) * width
+    student_counts = array('l')
+    day_counts = array('l', [0]) * (width * statuses)
+    row = -1
+    for student_id, full_name, day, status in marks:
+        if row < 0 or students[row][0] != student_id:
+            students.append((student_id, full_name))
+            cells.extend(blank)
+            student_counts.extend((0,) * statuses)
+            row += 1
+        offset = day - first_day
+        cells[row * width + offset] = status
+        if status < statuses:
+            student_counts[row * statuses + status] += 1
+            day_counts[offset * statuses + status] += 1
+    return AttendanceMatrix(students, first_day, width, cells, student_counts, day_counts)
+
+def load(class_id, start_date, end_date, db=database):
+    """Fetches a class's marks with a single query and returns them as an AttendanceMatrix."""
+    return build(db.get_attendance_marks(class_id, start_date, end_date), start_date, end_date)
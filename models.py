@@ -0,0 +1,250 @@
+from array import array
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PyQt6.QtWidgets import QStyledItemDelegate, QComboBox
+from database import STATUSES
+
+class RowTableModel(QAbstractTableModel):
+    """A read-only table model over a list of row tuples, as returned by the database module.
+
+    Rows are kept exactly as fetched; cells are only turned into text when a view
+    paints them, so populating costs the same for ten rows or a hundred thousand.
+    The first column doubles as the row's key under Qt.ItemDataRole.UserRole.
+    """
+    def __init__(self, headers, parent=None):
+        super().__init__(parent)
+        self.headers = list(headers)
+        self._rows = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            value = self._rows[index.row()][index.column()]
+            return "" if value is None else str(value)
+        if role == Qt.ItemDataRole.UserRole:
+            return self._rows[index.row()][0]
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.headers[section]
+        return None
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self._rows = rows if isinstance(rows, list) else list(rows)
+        self.endResetModel()
+
+    def update_rows(self, rows, max_changes=200):
+        """Brings the model in line with rows by emitting only row-level inserts, removals and updates.
+
+        Rows are matched on their first column, which must be unique. An empty model,
+        or a diff with more than max_changes structural edits, falls back to a reset.
+        """
+        old_keys = {row[0] for row in self._rows}
+        new_keys = {row[0] for row in rows}
+        if not self._rows or len(old_keys ^ new_keys) > max_changes:
+            self.set_rows(list(rows))
+            return
+        root = QModelIndex()
+        end = len(self._rows) - 1
+        while end >= 0:
+            if self._rows[end][0] in new_keys:
+                end -= 1
+                continue
+            start = end
+            while start > 0 and self._rows[start - 1][0] not in new_keys:
+                start -= 1
+            self.beginRemoveRows(root, start, end)
+            del self._rows[start:end + 1]
+            self.endRemoveRows()
+            end = start - 1
+        for position, row in enumerate(rows):
+            if position < len(self._rows) and self._rows[position][0] == row[0]:
+                if self._rows[position] != row:
+                    self._rows[position] = row
+                    self.dataChanged.emit(self.index(position, 0), self.index(position, self.columnCount() - 1))
+                continue
+            if row[0] in old_keys:
+                # The row moved, e.g. a rename changed its sort position.
+                current = next(i for i in range(position, len(self._rows)) if self._rows[i][0] == row[0])
+                self.beginRemoveRows(root, current, current)
+                del self._rows[current]
+                self.endRemoveRows()
+            self.beginInsertRows(root, position, position)
+            self._rows.insert(position, row)
+            self.endInsertRows()
+
+    def row(self, row):
+        return self._rows[row]
+
+    def rows(self):
+        return self._rows
+
+class PagedTableModel(RowTableModel):
+    """A RowTableModel that pulls further pages only when the view scrolls near the end.
+
+    fetch_page(after, on_page) must fetch the rows following the row `after` off the
+    GUI thread and pass them to on_page; a short page marks the end of the result.
+    No further page is asked for until the pending one has arrived.
+    """
+    def __init__(self, headers, page_size=500, parent=None):
+        super().__init__(headers, parent)
+        self.page_size = page_size
+        self.total = 0
+        self._fetch_page = None
+        self._exhausted = True
+        self._pending = False
+
+    def set_source(self, fetch_page, first_page, total):
+        self.beginResetModel()
+        self._fetch_page = fetch_page
+        self._rows = list(first_page)
+        self._exhausted = len(first_page) < self.page_size
+        self._pending = False
+        self.total = total
+        self.endResetModel()
+
+    def set_rows(self, rows):
+        self._fetch_page, self._exhausted, self._pending = None, True, False
+        super().set_rows(rows)
+        self.total = len(self._rows)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted and not self._pending
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        self._pending = True
+        source = self._fetch_page
+        source(self._rows[-1] if self._rows else None, lambda page: self._append_page(source, page))
+
+    def _append_page(self, source, page):
+        if source is not self._fetch_page:
+            return  # the model has been given another result meanwhile
+        self._pending = False
+        self._exhausted = len(page) < self.page_size
+        if page:
+            self.beginInsertRows(QModelIndex(), len(self._rows), len(self._rows) + len(page) - 1)
+            self._rows.extend(page)
+            self.endInsertRows()
+
+class MatrixTableModel(QAbstractTableModel):
+    """Shows a matrix.AttendanceMatrix: a row per student and a column per day, then totals.
+
+    Cells are read from the matrix's array as the view paints them, so showing a
+    semester costs no more than showing a week.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.matrix = None
+        self._headers = []
+
+    def set_matrix(self, matrix):
+        self.beginResetModel()
+        self.matrix = matrix
+        self._headers = list(matrix.headers()) if matrix else []
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid() or not self.matrix or not self.matrix.students:
+            return 0
+        return len(self.matrix.students) + 1  # the last row holds per-day totals
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._headers)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            return None
+        row, column, days = index.row(), index.column(), len(self.matrix.days)
+        if row == len(self.matrix.students):
+            if column == 1:
+                return "Attendance %"
+            if 2 <= column < 2 + days:
+                value = self.matrix.day_totals(column - 2)[4]
+                return "" if value is None else str(value)
+            return ""
+        if column < 2:
+            return self.matrix.students[row][column]
+        if column < 2 + days:
+            if role == Qt.ItemDataRole.ToolTipRole:
+                status = self.matrix.status(row, column - 2)
+                if status is None:
+                    return "Not marked"
+                return STATUSES[status] if status < len(STATUSES) else f"Status code {status}"
+            return self.matrix.code(row, column - 2)
+        value = self.matrix.student_totals(row)[column - 2 - days]
+        return "" if value is None else str(value)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self._headers[section]
+        return None
+
+class AttendanceModel(RowTableModel):
+    """Roster rows plus an editable status column stored as one byte per student."""
+    STATUS_COLUMN = 2
+
+    def __init__(self, parent=None):
+        super().__init__(["Student ID", "Full Name", "Status"], parent)
+        self._statuses = array('B')
+
+    def set_roster(self, roster):
+        """Loads (student_id, full_name, status) rows; unmarked students default to the first status."""
+        self.beginResetModel()
+        self._rows = [(student_id, full_name) for student_id, full_name, _ in roster]
+        self._statuses = array('B', (STATUSES.index(status) if status in STATUSES else 0 for _, _, status in roster))
+        self.endResetModel()
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if index.isValid() and index.column() == self.STATUS_COLUMN:
+            if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+                return STATUSES[self._statuses[index.row()]]
+            return None
+        return super().data(index, role)
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if role != Qt.ItemDataRole.EditRole or index.column() != self.STATUS_COLUMN or value not in STATUSES:
+            return False
+        self._statuses[index.row()] = STATUSES.index(value)
+        self.dataChanged.emit(index, index)
+        return True
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.column() == self.STATUS_COLUMN:
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def set_status(self, student_id, status):
+        """Updates one student's status, e.g. after a QR check-in; returns False if they are not listed."""
+        for row, values in enumerate(self._rows):
+            if values[0] == student_id:
+                return self.setData(self.index(row, self.STATUS_COLUMN), status)
+        return False
+
+    def marks(self):
+        """Returns the (student_id, status) pairs to hand to database.mark_attendance_bulk."""
+        return [(row[0], STATUSES[code]) for row, code in zip(self._rows, self._statuses)]
+
+class StatusDelegate(QStyledItemDelegate):
+    """Edits a status cell with a combo box that only exists while the cell is being edited."""
+    def createEditor(self, parent, option, index):
+        editor = QComboBox(parent)
+        editor.addItems(STATUSES)
+        editor.activated.connect(lambda: self.commitData.emit(editor))
+        return editor
+
+    def setEditorData(self, editor, index):
+        editor.setCurrentText(index.data(Qt.ItemDataRole.EditRole))
+
+    def setModelData(self, editor, model, index):
+        model.setData(index, editor.currentText(), Qt.ItemDataRole.EditRole)
@@ -0,0 +1,304 @@
+"""A local attendance service that owns the database on behalf of several terminals.
+
+Check-in terminals, AttendanceApp windows and cli.py connect to it instead of opening
+attendance.db themselves. Marks from every client are queued and written together,
+one transaction per batch on a single writer thread, so terminals never contend for
+the write lock; reads run on a small thread pool in parallel under WAL.
+
+The protocol is one JSON object per line over TCP on localhost, with requests named
+after the database module's functions:
+
+    {"id": 1, "op": "get_class_roster", "args": [3, "2024-03-14"]}
+    {"id": 1, "result": [["S001", "Ada Lovelace", "Present"], ...]}
+
+    python cli.py serve
+    python cli.py --service 127.0.0.1:8757 mark 3 2024-03-14 Present S001 S002
+    python main.py --service 127.0.0.1:8757
+"""
+import asyncio
+import functools
+import itertools
+import json
+import socket
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import backup
+import database
+import importer
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8757
+
+# Longest request or response line, e.g. a whole roster's marks or a report page.
+LINE_LIMIT = 64 * 1024 * 1024
+
+READS = frozenset({
+    "get_students", "get_classes", "get_students_by_class", "get_class_roster",
+    "get_attendance_report", "get_attendance_report_page", "count_attendance_report",
+    "get_attendance_summary", "get_daily_summary", "count_student_attendance", "count_class_attendance",
+    "get_archives", "search_students", "get_attendance_marks", "unknown_students",
+})
+WRITES = frozenset({
+    "add_student", "update_student", "add_class", "update_class", "enroll_student",
+})
+# Deletes and term archiving commit in chunks, so they run beside the writer thread
+# rather than holding up every mark behind them.
+PURGES = frozenset({"delete_student", "delete_class", "archive_term"})
+IMPORTS = {"import_students": importer.import_students, "import_enrollments": importer.import_enrollments}
+
+def _single(student_id, class_id, date, status):
+    return [(student_id, class_id, date, status)]
+
+def _bulk(class_id, date, marks, chunk_size=None):
+    return [(student_id, class_id, date, status) for student_id, status in marks]
+
+def _rows(rows):
+    return [tuple(row) for row in rows]
+
+# Marking calls, each turned into (student_id, class_id, date, status) rows for the shared writer.
+MARKS = {"mark_attendance": _single, "mark_attendance_bulk": _bulk, "mark_attendance_rows": _rows}
+
+class ServiceError(Exception):
+    """An error reported by the attendance service that has no closer local exception type."""
+
+# Exception types re-raised as themselves on the client side.
+ERRORS = {"ValueError": ValueError, "IntegrityError": sqlite3.IntegrityError,
+          "OperationalError": sqlite3.OperationalError}
+
+def parse_address(text):
+    """Accepts "host:port" or just a port number."""
+    host, _, port = text.rpartition(":")
+    return host or DEFAULT_HOST, int(port)
+
+class AttendanceService:
+    """Serves the database module over a local socket; see the module docstring for the protocol.
+
+    Marks that arrive while a batch is being written wait in a queue and all go into
+    the next transaction, so throughput rises with load instead of each terminal
+    paying for its own commit. linger (seconds) adds a wait before each batch to gather
+    more; max_batch caps the rows per transaction.
+    """
+    def __init__(self, path=None, host=DEFAULT_HOST, port=DEFAULT_PORT, max_batch=2000, linger=0.0, readers=4):
+        self.path = path or database.DB_PATH
+        self.host, self.port = host, port
+        self.max_batch, self.linger, self.readers = max_batch, linger, readers
+        self.batches = self.marks_written = 0
+        self.server = None
+
+    async def start(self):
+        database.configure(self.path)
+        loop = asyncio.get_running_loop()
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix="attendance-writer")
+        self._readers = ThreadPoolExecutor(self.readers, thread_name_prefix="attendance-reader")
+        await loop.run_in_executor(self._writer, database.setup_database)
+        self._pending = asyncio.Queue()
+        self._coalescer = asyncio.create_task(self._coalesce())
+        self.server = await asyncio.start_server(self._serve_client, self.host, self.port, limit=LINE_LIMIT)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        """Stops accepting requests, writes every mark already queued, then releases the database."""
+        self.server.close()
+        await self.server.wait_closed()
+        await self._pending.join()
+        self._coalescer.cancel()
+        self._writer.shutdown()
+        self._readers.shutdown()
+        database.close_connections()
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.close()
+
+    def run(self):
+        """Serves until interrupted (Ctrl+C)."""
+        try:
+            asyncio.run(self.serve_forever())
+        except KeyboardInterrupt:
+            pass
+
+    async def _serve_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = await self._handle(json.loads(line))
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle(self, request):
+        try:
+            result = await self._call(request.get("op"), request.get("args", []), request.get("kwargs", {}))
+        except Exception as e:
+            return {"id": request.get("id"), "error": str(e), "type": type(e).__name__}
+        return {"id": request.get("id"), "result": result}
+
+    async def _call(self, op, args, kwargs):
+        loop = asyncio.get_running_loop()
+        if op in MARKS:
+            done = loop.create_future()
+            self._pending.put_nowait((MARKS[op](*args, **kwargs), done))
+            return await done
+        if op in READS or op in PURGES:
+            return await loop.run_in_executor(self._readers, functools.partial(getattr(database, op), *args, **kwargs))
+        if op in WRITES:
+            return await loop.run_in_executor(self._writer, functools.partial(getattr(database, op), *args, **kwargs))
+        if op in IMPORTS:
+            result = await loop.run_in_executor(self._writer, functools.partial(IMPORTS[op], *args, **kwargs))
+            return {"inserted": result.inserted, "conflicts": result.conflicts}
+        if op == "snapshot":
+            # Only reads the database, from a snapshot, so it never holds up the writer.
+            return await loop.run_in_executor(self._readers, functools.partial(backup.snapshot, *args, **kwargs))
+        if op == "ping":
+            return {"path": self.path, "batches": self.batches, "marks_written": self.marks_written}
+        raise ServiceError(f"Unknown operation {op!r}.")
+
+    async def _coalesce(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._pending.get()]
+            if self.linger:
+                await asyncio.sleep(self.linger)
+            size = len(batch[0][0])
+            while size < self.max_batch and not self._pending.empty():
+                batch.append(self._pending.get_nowait())
+                size += len(batch[-1][0])
+            errors = await loop.run_in_executor(self._writer, self._write, batch)
+            for (_, done), error in zip(batch, errors):
+                if not done.done():
+                    if error is None:
+                        done.set_result(None)
+                    else:
+                        done.set_exception(error)
+                self._pending.task_done()
+
+    def _write(self, batch):
+        """Writes a batch in one transaction, falling back to one transaction per request if it fails."""
+        try:
+            database.mark_attendance_rows([row for rows, _ in batch for row in rows])
+            errors = [None] * len(batch)
+        except Exception:
+            # One bad request (e.g. an unknown student ID) must not lose everyone else's marks.
+            errors = []
+            for rows, _ in batch:
+                try:
+                    database.mark_attendance_rows(rows)
+                    errors.append(None)
+                except Exception as e:
+                    errors.append(e)
+        self.batches += 1
+        self.marks_written += sum(len(rows) for (rows, _), error in zip(batch, errors) if error is None)
+        return errors
+
+class Client:
+    """Stands in for the database module, forwarding each call to an AttendanceService.
+
+    Offers the same function names, so it can be handed to TaskRunner, the exporter and
+    the check-in pipeline. Each thread gets its own socket, like the
+    database module's per-thread connections.
+    """
+    STATUSES = database.STATUSES
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=300):
+        self.host, self.port, self.timeout = host, port, timeout
+        self._local = threading.local()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._sockets = []
+
+    def _stream(self):
+        stream = getattr(self._local, 'stream', None)
+        if stream is None:
+            sock = socket.create_connection((self.host, self.port), self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            stream = self._local.stream = sock.makefile('rwb')
+            with self._lock:
+                self._sockets.append((sock, stream))
+        return stream
+
+    def call(self, op, *args, **kwargs):
+        stream = self._stream()
+        request_id = next(self._ids)
+        try:
+            stream.write(json.dumps({"id": request_id, "op": op, "args": args, "kwargs": kwargs}).encode() + b"\n")
+            stream.flush()
+            line = stream.readline()
+        except OSError:
+            self._local.stream = None
+            raise
+        if not line:
+            self._local.stream = None
+            raise ConnectionError("The attendance service closed the connection.")
+        response = json.loads(line)
+        if "error" in response:
+            raise ERRORS.get(response["type"], ServiceError)(response["error"])
+        result = response["result"]
+        # JSON turns row tuples into lists; give callers the tuples the database module returns.
+        return [tuple(row) if isinstance(row, list) else row for row in result] if isinstance(result, list) else result
+
+    def __getattr__(self, name):
+        if name in READS or name in WRITES or name in MARKS or name in PURGES:
+            return functools.partial(self.call, name)
+        raise AttributeError(name)
+
+    def setup_database(self):
+        """Checks the service is reachable; the service sets the database up itself."""
+        return self.call("ping")
+
+    def mark_attendance_bulk(self, class_id, date, marks, progress=None, chunk_size=1000):
+        self.call("mark_attendance_bulk", class_id, date, marks)
+        if progress:
+            progress(len(marks), len(marks))
+
+    def delete_student(self, student_id, progress=None, chunk_size=20000):
+        return self.call("delete_student", student_id, chunk_size=chunk_size)
+
+    def delete_class(self, class_id, progress=None, chunk_size=20000):
+        return self.call("delete_class", class_id, chunk_size=chunk_size)
+
+    def archive_term(self, term, start_date, end_date, path=None, progress=None, compact=True):
+        return self.call("archive_term", term, start_date, end_date, path, compact=compact)
+
+    def iter_attendance_report(self, class_id, start_date, end_date, batch_size=5000):
+        after = None
+        while True:
+            page = self.get_attendance_report_page(class_id, start_date, end_date, after, batch_size)
+            if page:
+                yield page
+            if len(page) < batch_size:
+                break
+            after = page[-1]
+
+    def import_students(self, path, chunk_size=5000, progress=None):
+        return self._imported(self.call("import_students", path, chunk_size=chunk_size))
+
+    def import_enrollments(self, path, create_classes=False, chunk_size=5000, progress=None):
+        return self._imported(self.call("import_enrollments", path, create_classes=create_classes,
+                                        chunk_size=chunk_size))
+
+    def snapshot(self, directory, compress=False, keep=None, pages=256, pause=0.01, progress=None):
+        return self.call("snapshot", directory, compress, keep, pages, pause)
+
+    def _imported(self, response):
+        result = importer.ImportResult()
+        result.inserted = response["inserted"]
+        result.conflicts = [tuple(conflict) for conflict in response["conflicts"]]
+        return result
+
+    def close(self):
+        with self._lock:
+            sockets, self._sockets = self._sockets, []
+        for sock, stream in sockets:
+            stream.close()
+            sock.close()
+        self._local.__dict__.pop('stream', None)
@@ -0,0 +1,95 @@
+"""Reads and deletes across term archives.
+
+    python -m unittest discover tests
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database
+
+MONTHS = [f"2024-{month:02d}" for month in range(1, 13)]
+
+class ArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.original_path = database.DB_PATH
+        self.directory = tempfile.mkdtemp()
+        database.configure(os.path.join(self.directory, "attendance.db"))
+        database.setup_database()
+        database.add_class("Math")
+        for n in range(3):
+            database.add_student(f"S{n}", f"Student {n}")
+            database.enroll_student(f"S{n}", 1)
+        for month in MONTHS:
+            for day in ("01", "15"):
+                database.mark_attendance_bulk(1, f"{month}-{day}", [("S0", "Present"), ("S1", "Late"), ("S2", "Absent")])
+
+    def tearDown(self):
+        database.configure(self.original_path)
+        shutil.rmtree(self.directory)
+
+    def reports(self):
+        start, end = "2024-01-01", "2024-12-31"
+        pages, page = [], database.get_attendance_report_page(1, start, end, None, 10)
+        while page:
+            pages += page
+            page = database.get_attendance_report_page(1, start, end, page[-1], 10)
+        batches = [row for batch in database.iter_attendance_report(1, start, end, 10) for row in batch]
+        return (database.get_attendance_report(1, start, end), pages, batches,
+                database.get_attendance_summary(1, start, end),
+                database.get_daily_summary(1, start, end), database.count_attendance_report(1, start, end),
+                database.get_attendance_marks(1, start, end))
+
+    def test_more_archives_than_can_be_attached(self):
+        before = self.reports()
+        for month in MONTHS[:11]:
+            database.archive_term(month, f"{month}-01", f"{month}-28", compact=False)
+        self.assertGreater(len(database.get_archives()), 10)
+        self.assertEqual(self.reports(), before)
+        database.rebuild_rollups()
+        self.assertEqual(self.reports(), before)
+
+    def test_terms_sharing_an_archive_file(self):
+        before = self.reports(), database.count_student_attendance("S0")
+        database.archive_term("T 1", "2024-01-01", "2024-01-31", compact=False)
+        database.archive_term("T-1", "2024-02-01", "2024-02-29", compact=False)
+        (_, _, _, _, first), (_, _, _, _, second) = database.get_archives()
+        self.assertNotEqual(first, second)
+        with self.assertRaises(ValueError):
+            database.archive_term("T1", "2024-03-01", "2024-03-31", path=first)
+        # Databases archived before names carried the archive ID can have two terms in one file.
+        conn = database.get_connection()
+        conn.execute("ATTACH DATABASE ? AS shared", (database.archive_path(first),))
+        conn.execute("ATTACH DATABASE ? AS other", (database.archive_path(second),))
+        with conn:
+            conn.execute("INSERT INTO shared.attendance SELECT * FROM other.attendance")
+            conn.execute("UPDATE archives SET path = ? WHERE term = 'T-1'", (first,))
+        database.close_connections()
+        database.rebuild_rollups()
+        self.assertEqual((self.reports(), database.count_student_attendance("S0")), before)
+        database.delete_student("S0")
+        self.assertEqual([rows for _, _, _, rows, _ in database.get_archives()], [4, 4])
+
+    def test_archives_get_a_student_index(self):
+        database.archive_term("Jan", "2024-01-01", "2024-01-31", compact=False)
+        self.assertEqual(database.check_query_plans(), [])
+        (_, _, _, _, path), = database.get_archives()
+        # Archives written before they had the index get it when first attached.
+        archive = sqlite3.connect(database.archive_path(path))
+        archive.execute("DROP INDEX idx_attendance_student")
+        archive.close()
+        database.close_connections()
+        self.assertEqual(database.count_student_attendance("S0"), 24)
+        conn = database.get_connection()
+        schema, = conn.archives.values()
+        plan = database.explain_query_plan(
+            database.PURGE_CHUNK.format(table=f"{schema}.attendance", column="student_id", days=database.ARCHIVE_DAYS),
+            ("S0", 0, 9999999, 100))
+        self.assertTrue(all("SCAN" not in step for step in plan), plan)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""Migrates copies of the shipped database and of a legacy one with orphaned marks.
+
+    python -m unittest discover tests
+"""
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import database
+
+LEGACY_SCHEMA = '''
+    CREATE TABLE students (student_id TEXT PRIMARY KEY, full_name TEXT NOT NULL);
+    CREATE TABLE classes (class_id INTEGER PRIMARY KEY AUTOINCREMENT, class_name TEXT UNIQUE NOT NULL);
+    CREATE TABLE enrollments (
+        enrollment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_id TEXT NOT NULL REFERENCES students(student_id) ON DELETE CASCADE,
+        class_id INTEGER NOT NULL REFERENCES classes(class_id) ON DELETE CASCADE,
+        UNIQUE(student_id, class_id));
+    CREATE TABLE attendance (
+        attendance_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_id TEXT NOT NULL REFERENCES students(student_id) ON DELETE CASCADE,
+        class_id INTEGER NOT NULL REFERENCES classes(class_id) ON DELETE CASCADE,
+        date TEXT NOT NULL,
+        status TEXT NOT NULL);
+    INSERT INTO students VALUES ('S1', 'Ada Lovelace');
+    INSERT INTO classes (class_name) VALUES ('Math');
+    INSERT INTO attendance (student_id, class_id, date, status) VALUES
+        ('S1', 1, '2024-03-01', 'Present'),
+        ('S1', 1, '2024-03-02', 'Late'),
+        ('GONE', 1, '2024-03-01', 'Present'),
+        ('S1', 9, '2024-03-01', 'Absent');
+'''
+
+class MigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.original_path = database.DB_PATH
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "attendance.db")
+
+    def tearDown(self):
+        database.configure(self.original_path)
+        shutil.rmtree(self.directory)
+
+    def migrate(self):
+        database.configure(self.path)
+        database.setup_database()
+        conn = database.get_connection()
+        self.assertEqual(database.schema_version(conn), len(database.MIGRATIONS))
+        self.assertEqual(conn.execute("PRAGMA foreign_key_check").fetchall(), [])
+        return conn
+
+    def test_shipped_database(self):
+        shutil.copyfile(os.path.join(ROOT, "attendance.db"), self.path)
+        conn = self.migrate()
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM attendance").fetchone()[0],
+                         conn.execute("SELECT COUNT(*) FROM attendance JOIN students USING (student_id)").fetchone()[0])
+
+    def test_orphaned_marks_are_dropped(self):
+        legacy = sqlite3.connect(self.path)
+        legacy.executescript(LEGACY_SCHEMA)
+        legacy.close()
+        conn = self.migrate()
+        self.assertEqual(conn.execute("SELECT student_id, class_id, date(day), status FROM attendance ORDER BY day").fetchall(),
+                         [("S1", 1, "2024-03-01", 0), ("S1", 1, "2024-03-02", 2)])
+        self.assertEqual(conn.execute("SELECT present, absent, late FROM attendance_monthly").fetchall(), [(1, 0, 1)])
+
+if __name__ == "__main__":
+    unittest.main()
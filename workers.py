@@ -0,0 +1,131 @@
+import sqlite3
+import threading
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+import database
+
+class Cancelled(Exception):
+    """Raised inside a task's progress callback once the task has been superseded or cancelled."""
+
+class TaskSignals(QObject):
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object)
+    progress = pyqtSignal(int, int)
+    ended = pyqtSignal()
+
+class Task(QRunnable):
+    """Runs one database call on a pool thread, using that thread's pooled connection."""
+    def __init__(self, fn, args, kwargs, with_progress=False, connect=database.get_connection):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.fn, self.args, self.kwargs = fn, args, kwargs
+        self.with_progress = with_progress
+        self.connect = connect
+        self.signals = TaskSignals()
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def cancel(self):
+        """Marks the task cancelled and interrupts its SQL statement if one is running."""
+        self._cancelled.set()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.interrupt()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def report(self, done, total):
+        """Progress callback handed to long-running database functions."""
+        if self._cancelled.is_set():
+            raise Cancelled()
+        self.signals.progress.emit(done, total)
+
+    def run(self):
+        try:
+            self._run()
+        finally:
+            self.signals.ended.emit()
+
+    def _run(self):
+        if self._cancelled.is_set():
+            return
+        kwargs = dict(self.kwargs, progress=self.report) if self.with_progress else self.kwargs
+        if self.connect is not None:
+            with self._lock:
+                self._conn = self.connect()
+        try:
+            result = self.fn(*self.args, **kwargs)
+        except Cancelled:
+            return
+        except Exception as e:
+            if not (self._cancelled.is_set() and isinstance(e, sqlite3.OperationalError)):
+                self.signals.failed.emit(e)
+            return
+        finally:
+            with self._lock:
+                self._conn = None
+        if not self._cancelled.is_set():
+            self.signals.finished.emit(result)
+
+class TaskRunner(QObject):
+    """Runs database functions off the GUI thread and delivers their results through Qt signals.
+
+    Tasks submitted under the same key supersede each other: starting a new one
+    cancels the previous one, and a cancelled task's result is never delivered.
+    Pool threads never expire, so each keeps its pooled SQLite connection. With a
+    db that has no local connections (a service.Client), cancelled calls still run
+    to completion on the service but their results are dropped.
+    """
+    busy_changed = pyqtSignal(bool)
+
+    def __init__(self, parent=None, max_threads=4, db=database):
+        super().__init__(parent)
+        self.connect = getattr(db, 'get_connection', None)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self.pool.setExpiryTimeout(-1)
+        self._keyed = {}
+        self._tasks = set()
+
+    def submit(self, key, fn, *args, on_result=None, on_error=None, on_progress=None, progress=False, **kwargs):
+        """Queues fn(*args, **kwargs); pass progress=True to give fn a progress(done, total) callback."""
+        if key is not None:
+            self.cancel(key)
+            self._keyed[key] = task = Task(fn, args, kwargs, progress, self.connect)
+        else:
+            task = Task(fn, args, kwargs, progress, self.connect)
+        task.signals.finished.connect(lambda result: self._deliver(task, on_result, result))
+        task.signals.failed.connect(lambda error: self._deliver(task, on_error, error))
+        if on_progress is not None:
+            task.signals.progress.connect(lambda done, total: self._deliver(task, on_progress, done, total))
+        task.signals.ended.connect(lambda: self._ended(key, task))
+        # The pool does not own the runnable, so keep it referenced until it has run.
+        self._tasks.add(task)
+        if len(self._tasks) == 1:
+            self.busy_changed.emit(True)
+        self.pool.start(task)
+        return task
+
+    def _deliver(self, task, callback, *values):
+        if callback is not None and not task.is_cancelled():
+            callback(*values)
+
+    def _ended(self, key, task):
+        self._tasks.discard(task)
+        if key is not None and self._keyed.get(key) is task:
+            del self._keyed[key]
+        if not self._tasks:
+            self.busy_changed.emit(False)
+
+    def cancel(self, key):
+        task = self._keyed.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    def shutdown(self, msecs=5000):
+        """Cancels everything outstanding and waits for the pool threads to finish."""
+        for task in self._tasks:
+            task.cancel()
+        self._keyed.clear()
+        return self.pool.waitForDone(msecs)